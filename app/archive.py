@@ -0,0 +1,158 @@
+"""Hot/cold retention: old threads move from `post`/`like` into `post_archive`/`like_archive`.
+
+A thread (a top-level post and its replies) is archived as a unit once none of it is newer than
+the horizon, a few hundred threads per short transaction so writers are never blocked for long.
+Listings read both tables in one merged query; a new reply or like on an archived thread moves
+it back into the hot tables. Search only covers hot posts.
+"""
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import delete, func, insert, literal, or_, select, union_all
+from sqlmodel import Session
+
+from app import models, pagination
+
+AFTER_DAYS = float(os.environ.get("VIBE_ARCHIVE_AFTER_DAYS", "90"))
+BATCH_SIZE = int(os.environ.get("VIBE_ARCHIVE_BATCH_SIZE", "200"))
+# sleep between batches so queued writers get the lock
+PAUSE = float(os.environ.get("VIBE_ARCHIVE_PAUSE_MS", "50")) / 1000
+
+_post = models.Post.__table__
+_post_archive = models.ArchivedPost.__table__
+_like = models.Like.__table__
+_like_archive = models.ArchivedLike.__table__
+
+POST_COLUMNS = ("id", "author_id", "content", "created_at", "parent_id", "like_count", "reply_count")
+# like ids are not carried over: they are not referenced anywhere and each table numbers its own rows
+_LIKE_COLUMNS = ("user_id", "post_id", "created_at")
+
+
+def horizon(days: float = AFTER_DAYS) -> datetime:
+    return datetime.now(timezone.utc) - timedelta(days=days)
+
+
+def archivable_threads(session: Session, before: datetime, limit: int) -> List[int]:
+    """Ids of up to `limit` of the oldest top-level posts whose whole thread, likes included, is older than `before`.
+
+    A thread revived by a reply or a like therefore stays hot until that reply or like ages out.
+    """
+    # SQLite hands out max(rowid) + 1 for new rows, so the newest post must stay: were it archived,
+    # its id would be reused and clash with the archived copy
+    newest = session.execute(select(func.max(_post.c.id))).scalar()
+    if newest is None:
+        return []
+    reply = _post.alias("reply")
+    live_reply = select(reply.c.id).where(
+        reply.c.parent_id == _post.c.id,
+        or_(reply.c.created_at >= before, reply.c.id == newest),
+    ).exists()
+    liked = _post.alias("liked")
+    live_like = (
+        select(_like.c.id)
+        .join(liked, liked.c.id == _like.c.post_id)
+        .where(or_(liked.c.id == _post.c.id, liked.c.parent_id == _post.c.id), _like.c.created_at >= before)
+        .exists()
+    )
+    stmt = (
+        select(_post.c.id)
+        .where(_post.c.parent_id.is_(None), _post.c.created_at < before, _post.c.id != newest, ~live_reply, ~live_like)
+        .order_by(_post.c.created_at, _post.c.id)
+        .limit(limit)
+    )
+    return list(session.execute(stmt).scalars())
+
+
+def _move(session: Session, roots: Iterable[int], src, dst, src_likes, dst_likes) -> Tuple[int, int]:
+    """Move the threads rooted at `roots` and their likes from one pair of tables to the other. Returns (posts, likes)."""
+    roots = list(roots)
+    in_thread = or_(src.c.id.in_(roots), src.c.parent_id.in_(roots))
+    thread_ids = select(src.c.id).where(in_thread)
+    session.execute(insert(dst).from_select(POST_COLUMNS, select(*(src.c[n] for n in POST_COLUMNS)).where(in_thread)))
+    likes = session.execute(insert(dst_likes).from_select(
+        _LIKE_COLUMNS, select(*(src_likes.c[n] for n in _LIKE_COLUMNS)).where(src_likes.c.post_id.in_(thread_ids))
+    )).rowcount
+    session.execute(delete(src_likes).where(src_likes.c.post_id.in_(thread_ids)))
+    # replies first, so no remaining row points at a deleted parent
+    posts = session.execute(delete(src).where(src.c.parent_id.in_(roots))).rowcount
+    posts += session.execute(delete(src).where(src.c.id.in_(roots))).rowcount
+    return posts, likes
+
+
+def archive_batch(session: Session, before: datetime, limit: int = BATCH_SIZE) -> Dict[str, int]:
+    """Archive up to `limit` threads older than `before` in one transaction."""
+    roots = archivable_threads(session, before, limit)
+    if not roots:
+        return {"threads": 0, "posts": 0, "likes": 0}
+    posts, likes = _move(session, roots, _post, _post_archive, _like, _like_archive)
+    session.commit()
+    return {"threads": len(roots), "posts": posts, "likes": likes}
+
+
+def run(engine, before: Optional[datetime] = None, batch_size: int = BATCH_SIZE, pause: float = PAUSE,
+        max_batches: Optional[int] = None) -> Dict[str, int]:
+    """Archive everything older than `before` (default: the configured horizon), batch by batch."""
+    before = horizon() if before is None else before
+    totals = {"threads": 0, "posts": 0, "likes": 0, "batches": 0}
+    while max_batches is None or totals["batches"] < max_batches:
+        with Session(engine) as session:
+            moved = archive_batch(session, before, batch_size)
+        if not moved["threads"]:
+            break
+        for key, value in moved.items():
+            totals[key] += value
+        totals["batches"] += 1
+        if pause:
+            time.sleep(pause)
+    return totals
+
+
+def archived_ids(session: Session, post_ids: Iterable[int]) -> Set[int]:
+    """Which of `post_ids` are in the archive."""
+    ids = set(post_ids)
+    if not ids:
+        return set()
+    return set(session.execute(select(_post_archive.c.id).where(_post_archive.c.id.in_(ids))).scalars())
+
+
+def restore(session: Session, post_ids: Iterable[int]) -> int:
+    """Move the archived threads containing any of `post_ids` back into the hot tables.
+
+    Does not commit: the caller commits the restore together with the reply or like that
+    needed it, so an archive run can never see the thread revived without its new row.
+    Returns the number of posts restored (0 when none of the ids is archived).
+    """
+    ids = set(post_ids)
+    if not ids:
+        return 0
+    rows = session.execute(select(_post_archive.c.id, _post_archive.c.parent_id).where(_post_archive.c.id.in_(ids))).all()
+    if not rows:
+        return 0
+    posts, _ = _move(session, {parent_id or post_id for post_id, parent_id in rows}, _post_archive, _post, _like_archive, _like)
+    return posts
+
+
+def newest_first(session: Session, cursor: Optional[str], page_size: int,
+                 where: Optional[Callable] = None, offset: int = 0) -> list:
+    """One page of posts, newest first, across the hot and the archive table.
+
+    `where(table)` filters both tables. Each side is a bounded range scan on its own
+    (created_at, id) index and the two are merged in the same statement, so hot pages only
+    touch the newest end of the archive. Rows carry the Post columns plus `archived`.
+    """
+    sides = []
+    for table, archived in ((_post, False), (_post_archive, True)):
+        stmt = select(*(table.c[n] for n in POST_COLUMNS), literal(archived).label("archived"))
+        if where is not None:
+            stmt = stmt.where(where(table))
+        stmt = pagination.newest_first(stmt, cursor, table.c.created_at, table.c.id).limit(offset + page_size)
+        sides.append(select(stmt.subquery()))
+    merged = union_all(*sides).subquery()
+    stmt = select(merged).order_by(merged.c.created_at.desc(), merged.c.id.desc()).offset(offset).limit(page_size)
+    return session.execute(stmt).all()
+
+
+def is_archived(post) -> bool:
+    return bool(getattr(post, "archived", False))
@@ -0,0 +1,113 @@
+"""Frontend asset pipeline: content-hashed, precompressed build output and a static handler that serves it."""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+from typing import Dict
+
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+from app import compression
+
+SOURCE_DIR = "frontend"
+BUILD_DIR = os.path.join("frontend", "dist")
+# only these are fingerprinted; everything referencing them (index.html) keeps its name
+FINGERPRINTED = (".js", ".css")
+PRECOMPRESSED = (".js", ".css", ".html", ".svg", ".json")
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+# index.html must stay fresh so a deploy is picked up quickly; it is small and revalidates cheaply
+HTML_MAX_AGE = int(os.environ.get("VIBE_UI_HTML_MAX_AGE", "60"))
+_FINGERPRINT = re.compile(r"\.[0-9a-f]{12}\.[A-Za-z0-9]+$")
+
+
+def _write(path: str, data: bytes) -> None:
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def _precompress(path: str, data: bytes) -> None:
+    """Write `path`.gz and `path`.br (if brotli is installed) next to `path` at maximum compression."""
+    _write(path + ".gz", gzip.compress(data, compresslevel=9, mtime=0))
+    if compression.brotli is not None:
+        _write(path + ".br", compression.brotli.compress(data, quality=11))
+
+
+def build(src: str = SOURCE_DIR, dst: str = BUILD_DIR, url_prefix: str = "/ui/") -> Dict[str, str]:
+    """Copy `src` into `dst` with fingerprinted JS/CSS names, rewrite references in HTML files,
+    precompress everything text-like and write `manifest.json`. Returns the name mapping.
+
+    Fingerprinted files from earlier builds are kept: pages cached before a deploy may still ask for them.
+    """
+    os.makedirs(dst, exist_ok=True)
+    manifest: Dict[str, str] = {}
+    html = []
+    for name in sorted(os.listdir(src)):
+        path = os.path.join(src, name)
+        if not os.path.isfile(path):
+            continue
+        with open(path, "rb") as f:
+            data = f.read()
+        if name.endswith(".html"):
+            html.append((name, data))
+            continue
+        out = name
+        if name.endswith(FINGERPRINTED):
+            stem, ext = os.path.splitext(name)
+            out = f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+            manifest[name] = out
+        _write(os.path.join(dst, out), data)
+        if out.endswith(PRECOMPRESSED):
+            _precompress(os.path.join(dst, out), data)
+    for name, data in html:
+        text = data.decode("utf-8")
+        for original, fingerprinted in manifest.items():
+            text = text.replace(f"{url_prefix}{original}", f"{url_prefix}{fingerprinted}")
+        data = text.encode("utf-8")
+        _write(os.path.join(dst, name), data)
+        _precompress(os.path.join(dst, name), data)
+    _write(os.path.join(dst, "manifest.json"), json.dumps(manifest, indent=2, sort_keys=True).encode())
+    return manifest
+
+
+def ui_directory() -> str:
+    """The built assets when a build exists, else the sources (development)."""
+    return os.environ.get("VIBE_UI_DIR") or (BUILD_DIR if os.path.isfile(os.path.join(BUILD_DIR, "index.html")) else SOURCE_DIR)
+
+
+class AssetFiles(StaticFiles):
+    """StaticFiles that serves `<file>.br` / `<file>.gz` when the client accepts them and sets caching
+    by name: fingerprinted files are immutable, everything else (index.html) is short-lived.
+
+    The sidecars and `manifest.json` are build artifacts, not URLs: asking for them directly is a 404.
+    """
+
+    async def get_response(self, path: str, scope) -> Response:
+        if path.endswith((".br", ".gz")) or os.path.basename(path) == "manifest.json":
+            raise HTTPException(status_code=404)
+        return await super().get_response(path, scope)
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        path = str(full_path)
+        variants = [e for e, suffix in (("br", ".br"), ("gzip", ".gz")) if os.path.isfile(path + suffix)]
+        encoding = compression.choose_encoding(request_headers.get("accept-encoding", ""), variants) if variants else None
+        headers = {"Cache-Control": IMMUTABLE if _FINGERPRINT.search(path) else f"public, max-age={HTML_MAX_AGE}"}
+        if variants:
+            headers["Vary"] = "Accept-Encoding"
+        if encoding is not None:
+            variant = path + (".br" if encoding == "br" else ".gz")
+            headers["Content-Encoding"] = encoding
+            # media type comes from the original name, validators from the variant actually sent
+            response = FileResponse(variant, status_code=status_code, headers=headers, method=scope["method"],
+                                    stat_result=os.stat(variant), media_type=mimetypes.guess_type(path)[0] or "text/plain")
+        else:
+            response = FileResponse(path, status_code=status_code, headers=headers, method=scope["method"], stat_result=stat_result)
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
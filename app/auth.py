@@ -1,31 +1,33 @@
 from datetime import datetime, timedelta, timezone
 from typing import Optional
-from argon2 import PasswordHasher
-from argon2.exceptions import VerifyMismatchError
 from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import update
 from sqlmodel import Session, select
-from app import models, db
+from app import cache, models, db, passwords
 import os
 
-_PH = PasswordHasher()
 OAUTH2_SCHEME = OAuth2PasswordBearer(tokenUrl="/token")
 
 SECRET_KEY = os.environ.get("VIBE_SECRET", "super-secret-for-dev")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7
 
+# authenticated principals keyed by the token's (uid, sub) claims, so most requests skip the user lookup
+_principals = cache.TTLCache(
+    maxsize=int(os.environ.get("VIBE_PRINCIPAL_CACHE_SIZE", "1024")),
+    ttl=float(os.environ.get("VIBE_PRINCIPAL_CACHE_TTL", "60")),
+)
 
-def verify_password(plain: str, hashed: str) -> bool:
-    try:
-        return _PH.verify(hashed, plain)
-    except VerifyMismatchError:
-        return False
+
+async def hash_password(password: str) -> str:
+    """Hash on the password service's worker pool instead of the request thread."""
+    return await passwords.service.hash(password)
 
 
-def get_password_hash(password: str) -> str:
-    return _PH.hash(password)
+def create_user_token(user: models.User) -> str:
+    return create_access_token({"sub": user.username, "uid": user.id})
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -37,17 +39,32 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
-def authenticate_user(session: Session, username: str, password: str) -> Optional[models.User]:
+def get_user_by_username(session: Session, username: str) -> Optional[models.User]:
     statement = select(models.User).where(models.User.username == username)
-    user = session.exec(statement).first()
+    return session.exec(statement).first()
+
+
+async def authenticate_user(username: str, password: str) -> Optional[models.User]:
+    user = await db.run(get_user_by_username, username)
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    ok, new_hash = await passwords.service.verify(user.hashed_password, password)
+    if not ok:
         return None
+    if new_hash is not None:
+        # the stored hash predates the current Argon2 parameters; upgrade it transparently
+        await db.run_write(_store_password_hash, user.id, new_hash)
+        user.hashed_password = new_hash
+        invalidate_principal(user.id)
     return user
 
 
-def get_current_user(token: str = Depends(OAUTH2_SCHEME)):
+def _store_password_hash(session: Session, user_id: int, hashed: str) -> None:
+    session.exec(update(models.User).where(models.User.id == user_id).values(hashed_password=hashed))
+    session.commit()
+
+
+async def get_current_user(token: str = Depends(OAUTH2_SCHEME)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -56,14 +73,29 @@ def get_current_user(token: str = Depends(OAUTH2_SCHEME)):
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
+        user_id: Optional[int] = payload.get("uid")
         if username is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    # fetch user
-    with next(db.get_session()) as session:
-        statement = select(models.User).where(models.User.username == username)
-        user = session.exec(statement).first()
-        if user is None:
+
+    async def load():
+        # tokens minted before the uid claim existed only carry the username
+        if user_id is not None:
+            user = await db.run(lambda session: session.get(models.User, user_id))
+        else:
+            user = await db.run(get_user_by_username, username)
+        if user is None or user.username != username:
             raise credentials_exception
-        return user
+        return user, [f"user:{user.id}"]
+
+    return await _principals.aget_or_set((user_id, username), load)
+
+
+def invalidate_principal(user_id: int) -> None:
+    """Forget the cached principal for `user_id`; call after changing or deleting the user."""
+    _principals.invalidate(f"user:{user_id}")
+
+
+def clear_principal_cache() -> None:
+    _principals.clear()
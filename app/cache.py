@@ -0,0 +1,159 @@
+"""Small in-process response cache: LRU + TTL, tag invalidation and single-flight misses."""
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Optional, Set, Tuple
+
+
+# what waiters of an async flight see when its leader was cancelled
+_ABANDONED = object()
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class TTLCache:
+    """Bounded LRU cache whose entries expire after `ttl` seconds.
+
+    Entries carry tags so writers can drop exactly the entries they affect.
+    Concurrent misses on the same key are coalesced: one caller computes, the
+    others wait for its result. A `ttl` or `maxsize` of 0 disables caching.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = 5.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[Hashable, Tuple[float, Any, Set[str]]]" = OrderedDict()
+        self._inflight: Dict[Hashable, _Flight] = {}
+        self._ainflight: Dict[Hashable, "asyncio.Future[Any]"] = {}
+        # bumped on every invalidation so results computed before a write are not stored
+        self._generation = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0 and self.ttl > 0
+
+    def get_or_set(self, key: Hashable, compute: Callable[[], Tuple[Any, Iterable[str]]]) -> Any:
+        """Return the cached value for `key`, or call `compute()` -> (value, tags) and cache it."""
+        if not self.enabled:
+            return compute()[0]
+        with self._lock:
+            hit, value = self._lookup(key)
+            if hit:
+                return value
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+                generation = self._generation
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+        try:
+            value, tags = compute()
+            flight.value = value
+            self._store(key, value, tags, generation)
+            return value
+        except BaseException as exc:
+            flight.error = exc
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.done.set()
+
+    async def aget_or_set(self, key: Hashable, compute: Callable[[], Awaitable[Tuple[Any, Iterable[str]]]]) -> Any:
+        """Async variant of `get_or_set`; waiting callers await the leader instead of blocking.
+
+        If the leader is cancelled, its waiters are not: the first of them to wake up computes instead.
+        """
+        if not self.enabled:
+            return (await compute())[0]
+        while True:
+            with self._lock:
+                hit, value = self._lookup(key)
+                if hit:
+                    return value
+                future = self._ainflight.get(key)
+                leader = future is None
+                if leader:
+                    future = self._ainflight[key] = asyncio.get_running_loop().create_future()
+                    generation = self._generation
+            if not leader:
+                value = await asyncio.shield(future)
+                if value is _ABANDONED:
+                    continue
+                return value
+            try:
+                value, tags = await compute()
+            except BaseException as exc:
+                with self._lock:
+                    self._ainflight.pop(key, None)
+                if isinstance(exc, asyncio.CancelledError):
+                    future.set_result(_ABANDONED)
+                else:
+                    future.set_exception(exc)
+                    # mark retrieved so an unawaited failure does not log "exception never retrieved"
+                    future.exception()
+                raise
+            self._store(key, value, tags, generation)
+            with self._lock:
+                self._ainflight.pop(key, None)
+            future.set_result(value)
+            return value
+
+    def _lookup(self, key: Hashable) -> Tuple[bool, Any]:
+        # caller holds self._lock
+        entry = self._data.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self._data.move_to_end(key)
+            self.hits += 1
+            return True, entry[1]
+        if entry is not None:
+            del self._data[key]
+        self.misses += 1
+        return False, None
+
+    def _store(self, key: Hashable, value: Any, tags: Iterable[str], generation: int) -> None:
+        with self._lock:
+            # an invalidation ran while we were computing; the value may already be stale
+            if generation != self._generation:
+                return
+            self._data[key] = (time.monotonic() + self.ttl, value, set(tags))
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, *tags: str) -> None:
+        """Drop every entry carrying any of `tags`."""
+        wanted = set(tags)
+        with self._lock:
+            self._generation += 1
+            for key in [k for k, (_, _, t) in self._data.items() if t & wanted]:
+                del self._data[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._data.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
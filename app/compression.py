@@ -0,0 +1,141 @@
+"""Negotiated response compression: brotli when the client accepts it and the module is installed, else gzip."""
+import gzip
+import os
+from typing import List, Optional, Sequence, Tuple
+
+try:
+    import brotli
+except ImportError:  # optional: without it only gzip is offered
+    brotli = None
+
+# bodies smaller than this are sent as-is; compressing them costs more than it saves
+MINIMUM_SIZE = int(os.environ.get("VIBE_COMPRESS_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.environ.get("VIBE_GZIP_LEVEL", "6"))
+# brotli's default (11) is far too slow for per-request use; 4-5 beats gzip -6 at similar cost
+BROTLI_QUALITY = int(os.environ.get("VIBE_BROTLI_QUALITY", "4"))
+
+_COMPRESSIBLE = ("application/json", "text/", "application/javascript", "image/svg+xml")
+
+
+def choose_encoding(accept_encoding: str, available: Optional[Sequence[str]] = None) -> Optional[str]:
+    """Pick the encoding of `available` (default: what this server can produce) with the highest q-value in
+    the Accept-Encoding header; ties go to the earlier one in `available`."""
+    offered = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        offered[name.strip().lower()] = q
+    wildcard = offered.get("*", 0.0)
+    if available is None:
+        available = ("br", "gzip") if brotli is not None else ("gzip",)
+    best, best_q = None, 0.0
+    for encoding in available:
+        q = offered.get(encoding, wildcard)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing complete JSON/text bodies above `minimum_size`.
+
+    Streaming responses (several body chunks, e.g. server-sent events) and responses that
+    already carry a Content-Encoding pass through untouched. Every response of a compressible
+    type gets `Vary: Accept-Encoding`, compressed or not, so shared caches keep the variants apart.
+    """
+
+    def __init__(self, app, minimum_size: int = MINIMUM_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept = ""
+        for name, value in scope.get("headers", []):
+            if name == b"accept-encoding":
+                accept = value.decode("latin-1")
+                break
+        encoding = choose_encoding(accept) if accept else None
+
+        start = None
+        passthrough = False
+
+        async def wrapped_send(message):
+            nonlocal start, passthrough
+            if message["type"] == "http.response.start":
+                if _compressible_type(message["headers"]):
+                    message = {**message, "headers": _with_vary(message["headers"])}
+                if encoding is None:
+                    passthrough = True
+                    await send(message)
+                else:
+                    start = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+            if start is not None:
+                body = message.get("body", b"")
+                headers = start["headers"]
+                if message.get("more_body", False) or not self._compressible(headers, len(body)):
+                    passthrough = True
+                    await send(start)
+                    start = None
+                    await send(message)
+                    return
+                compressed = compress(body, encoding)
+                start["headers"] = _with_encoding(headers, encoding, len(compressed))
+                await send(start)
+                start = None
+                await send({"type": "http.response.body", "body": compressed})
+                return
+            await send(message)
+
+        await self.app(scope, receive, wrapped_send)
+
+    def _compressible(self, headers: List[Tuple[bytes, bytes]], size: int) -> bool:
+        if size < self.minimum_size:
+            return False
+        if any(name == b"content-encoding" for name, _ in headers):
+            return False
+        return _compressible_type(headers)
+
+
+def _compressible_type(headers: List[Tuple[bytes, bytes]]) -> bool:
+    content_type = b""
+    for name, value in headers:
+        if name == b"content-type":
+            content_type = value
+    content_type = content_type.decode("latin-1").lower()
+    return content_type.startswith(_COMPRESSIBLE) and not content_type.startswith("text/event-stream")
+
+
+def _with_vary(headers: List[Tuple[bytes, bytes]]) -> List[Tuple[bytes, bytes]]:
+    """`headers` with Accept-Encoding listed in a single Vary header."""
+    vary = [v for k, v in headers if k == b"vary"]
+    if any(part.strip().lower() in (b"accept-encoding", b"*") for v in vary for part in v.split(b",")):
+        return headers
+    out = [(k, v) for k, v in headers if k != b"vary"]
+    out.append((b"vary", b", ".join(vary + [b"Accept-Encoding"])))
+    return out
+
+
+def _with_encoding(headers: List[Tuple[bytes, bytes]], encoding: str, length: int) -> List[Tuple[bytes, bytes]]:
+    out = [(k, v) for k, v in _with_vary(headers) if k != b"content-length"]
+    out.append((b"content-encoding", encoding.encode()))
+    out.append((b"content-length", str(length).encode()))
+    return out
@@ -1,26 +1,376 @@
 from sqlmodel import SQLModel, create_engine, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from starlette.concurrency import run_in_threadpool
+from app import metrics
+import contextvars
+import functools
+import hashlib
+import hmac
+import itertools
 import os
-from typing import Generator
+import threading
+import time
+from typing import Any, Callable, Dict, Generator, List, Optional, TypeVar
 
+T = TypeVar("T")
 
 _engine = None
+_async_engine = None
+# read replicas, index-aligned with _async_replicas and _in_flight
+_replicas: List[Engine] = []
+_async_replicas: List[Any] = []
+_in_flight: List[int] = []
+_round_robin = itertools.count()
+
+# "round_robin" or "least_busy" (fewest units of work in flight, ties broken round-robin)
+REPLICA_POLICY = os.environ.get("VIBE_DB_REPLICA_POLICY", "round_robin")
+# after a write the client reads from the primary for this long, so it sees its own changes
+READ_YOUR_WRITES_SECONDS = float(os.environ.get("VIBE_DB_READ_YOUR_WRITES_SECONDS", "5"))
+PIN_COOKIE = "vibe_primary_until"
+# signs the pin cookie so clients cannot pin themselves; shared by workers, like the JWT secret
+_PIN_KEY = os.environ.get("VIBE_SECRET", "super-secret-for-dev").encode()
+_PIN_MAX = 10000
+
+
+def async_enabled() -> bool:
+    """Whether handlers talk to the database through the async engine (VIBE_DB_ASYNC=1)."""
+    return os.environ.get("VIBE_DB_ASYNC", "0").lower() in ("1", "true", "yes")
+
+
+def _async_url(url: str) -> str:
+    if url.startswith("sqlite:"):
+        return "sqlite+aiosqlite:" + url[len("sqlite:"):]
+    return url
+
+
+def sqlite_pragmas() -> Dict[str, str]:
+    """Per-connection SQLite pragmas; set a VIBE_SQLITE_* variable to "" to leave that pragma at SQLite's default."""
+    pragmas = {
+        # WAL lets readers proceed while a writer commits
+        "journal_mode": os.environ.get("VIBE_SQLITE_JOURNAL_MODE", "WAL"),
+        # NORMAL is durable across app crashes in WAL mode and avoids an fsync per commit
+        "synchronous": os.environ.get("VIBE_SQLITE_SYNCHRONOUS", "NORMAL"),
+        # wait for the writer lock instead of failing with "database is locked"
+        "busy_timeout": os.environ.get("VIBE_SQLITE_BUSY_TIMEOUT_MS", "5000"),
+        "mmap_size": os.environ.get("VIBE_SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)),
+        # negative values are KiB: 64 MiB page cache per connection
+        "cache_size": os.environ.get("VIBE_SQLITE_CACHE_SIZE", "-65536"),
+        "temp_store": os.environ.get("VIBE_SQLITE_TEMP_STORE", "MEMORY"),
+        "foreign_keys": os.environ.get("VIBE_SQLITE_FOREIGN_KEYS", ""),
+    }
+    return {name: value for name, value in pragmas.items() if value}
+
+
+def _pool_args(url: str) -> Dict[str, Any]:
+    # in-memory SQLite is private to its connection, keep SQLAlchemy's default pool for it
+    if url.startswith("sqlite") and (":memory:" in url or url.rstrip("/").endswith("sqlite:")):
+        return {}
+    return {
+        "pool_size": int(os.environ.get("VIBE_DB_POOL_SIZE", "5")),
+        "max_overflow": int(os.environ.get("VIBE_DB_MAX_OVERFLOW", "10")),
+        "pool_timeout": float(os.environ.get("VIBE_DB_POOL_TIMEOUT", "30")),
+    }
+
+
+# these write the database header or affect only writers; replicas belong to whoever replicates them
+_WRITER_PRAGMAS = ("journal_mode", "synchronous")
+
+
+def _install_sqlite_pragmas(engine: Engine, replica: bool = False) -> None:
+    pragmas = sqlite_pragmas()
+    if replica:
+        pragmas = {name: value for name, value in pragmas.items() if name not in _WRITER_PRAGMAS}
+        # refuse writes outright instead of relying on every caller to route them to the primary
+        pragmas["query_only"] = "ON"
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+
+def replica_urls() -> List[str]:
+    """Read replica URLs from the comma-separated VIBE_DATABASE_REPLICA_URLS (none by default)."""
+    return [url.strip() for url in os.environ.get("VIBE_DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+
+
+def _make_engines(url: str, replica: bool = False):
+    is_sqlite = url.startswith("sqlite")
+    connect_args = {"check_same_thread": False} if is_sqlite else {}
+    pool_args = _pool_args(url)
+    if pool_args and is_sqlite:
+        # SQLAlchemy 1.4 defaults file databases to NullPool, which reconnects (and re-runs the pragmas) per checkout
+        pool_args["poolclass"] = QueuePool
+    engine = create_engine(url, echo=False, connect_args=connect_args, **pool_args)
+    # the sync engine is always available for schema setup and scripts
+    async_engine = None
+    if async_enabled():
+        async_args = _pool_args(url)
+        if async_args:
+            async_args["poolclass"] = AsyncAdaptedQueuePool
+        async_engine = create_async_engine(_async_url(url), echo=False, **async_args)
+    if is_sqlite:
+        _install_sqlite_pragmas(engine, replica)
+        if async_engine is not None:
+            _install_sqlite_pragmas(async_engine.sync_engine, replica)
+    metrics.instrument_engine(engine)
+    if async_engine is not None:
+        metrics.instrument_engine(async_engine.sync_engine)
+    return engine, async_engine
 
 
 def init_engine():
-    global _engine
+    global _engine, _async_engine, _replicas, _async_replicas, _in_flight
     DATABASE_URL = os.environ.get("VIBE_DATABASE_URL", "sqlite:///./vibe.db")
-    connect_args = {"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
-    _engine = create_engine(DATABASE_URL, echo=False, connect_args=connect_args)
+    _engine, _async_engine = _make_engines(DATABASE_URL)
+    # replicas are only read from; their schema and data are kept in sync outside the app
+    replicas = [_make_engines(url, replica=True) for url in replica_urls()]
+    _replicas = [engine for engine, _ in replicas]
+    _async_replicas = [async_engine for _, async_engine in replicas]
+    _in_flight = [0] * len(replicas)
 
 
 def init_db():
     if _engine is None:
         init_engine()
+    # importing maintenance also registers every model on SQLModel.metadata
+    from app import maintenance
     SQLModel.metadata.create_all(_engine)
+    maintenance.upgrade_schema(_engine)
+
+
+class _RequestState:
+    __slots__ = ("pin_key", "pinned", "wrote")
+
+    def __init__(self, pin_key: Optional[int], pinned: bool):
+        self.pin_key = pin_key
+        self.pinned = pinned
+        self.wrote = False
+
+
+# "read" while a handler annotated with @reads runs; everything else goes to the primary
+_mode: contextvars.ContextVar[str] = contextvars.ContextVar("vibe_db_mode", default="write")
+_request: contextvars.ContextVar[Optional[_RequestState]] = contextvars.ContextVar("vibe_db_request", default=None)
+# hash of an Authorization header -> monotonic deadline, for clients that do not keep cookies
+_pins: Dict[int, float] = {}
+_pins_lock = threading.Lock()
+
+
+def reads(handler):
+    """Annotate a handler whose queries may be served by a read replica."""
+    @functools.wraps(handler)
+    async def wrapper(*args, **kwargs):
+        token = _mode.set("read")
+        try:
+            return await handler(*args, **kwargs)
+        finally:
+            _mode.reset(token)
+    return wrapper
+
+
+def writes(handler):
+    """Annotate a handler that writes: it runs on the primary and, when it succeeds, pins the
+    client to the primary for READ_YOUR_WRITES_SECONDS."""
+    @functools.wraps(handler)
+    async def wrapper(*args, **kwargs):
+        token = _mode.set("write")
+        try:
+            result = await handler(*args, **kwargs)
+        finally:
+            _mode.reset(token)
+        _wrote()
+        return result
+    return wrapper
+
+
+def _wrote() -> None:
+    """Record that the current request wrote, pinning its client to the primary."""
+    state = _request.get()
+    if state is not None:
+        state.wrote = True
+        if state.pin_key is not None:
+            _pin(state.pin_key)
+
+
+def _pin(key: int) -> None:
+    now = time.monotonic()
+    with _pins_lock:
+        if len(_pins) >= _PIN_MAX:
+            for stale in [k for k, until in _pins.items() if until <= now]:
+                del _pins[stale]
+            if len(_pins) >= _PIN_MAX:
+                _pins.clear()
+        _pins[key] = now + READ_YOUR_WRITES_SECONDS
+
+
+def _pinned(key: Optional[int]) -> bool:
+    return key is not None and _pins.get(key, 0.0) > time.monotonic()
+
+
+def pinned_to_primary() -> bool:
+    """Whether the current request reads from the primary because its client wrote recently."""
+    state = _request.get()
+    return state is not None and state.pinned
+
+
+def has_replicas() -> bool:
+    if _engine is None:
+        init_engine()
+    return bool(_replicas)
+
+
+def _pick_replica() -> Optional[int]:
+    """Index of the replica to read from for the current unit of work, or None for the primary."""
+    if not _replicas or _mode.get() != "read":
+        return None
+    if pinned_to_primary():
+        return None
+    start = next(_round_robin) % len(_replicas)
+    if REPLICA_POLICY != "least_busy":
+        return start
+    order = [(start + i) % len(_replicas) for i in range(len(_replicas))]
+    return min(order, key=lambda i: _in_flight[i])
+
+
+class ReadYourWritesMiddleware:
+    """Keeps a client on the primary for a while after it wrote, so replica lag never hides its own posts.
+
+    The pin is carried in a cookie (works across worker processes) and, for API clients that do not
+    keep cookies, in a per-process table keyed by the Authorization header. Does nothing without replicas.
+    """
+
+    def __init__(self, app, window: float = READ_YOUR_WRITES_SECONDS):
+        self.app = app
+        self.window = window
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.window <= 0 or not has_replicas():
+            await self.app(scope, receive, send)
+            return
+        pin_key = None
+        pinned = False
+        for name, value in scope.get("headers", []):
+            if name == b"authorization":
+                pin_key = hash(value)
+            elif name == b"cookie":
+                pinned = pinned or _cookie_pinned(value.decode("latin-1"), self.window)
+        state = _RequestState(pin_key, pinned or _pinned(pin_key))
+
+        async def wrapped_send(message):
+            if message["type"] == "http.response.start" and state.wrote:
+                until = int(time.time() + self.window) + 1
+                cookie = f"{PIN_COOKIE}={until}.{_pin_signature(until)}; Max-Age={int(self.window) + 1}; Path=/; HttpOnly; SameSite=Lax"
+                message["headers"] = list(message.get("headers", [])) + [(b"set-cookie", cookie.encode("latin-1"))]
+            await send(message)
+
+        token = _request.set(state)
+        try:
+            await self.app(scope, receive, wrapped_send)
+        finally:
+            _request.reset(token)
+
+
+def _pin_signature(until: int) -> str:
+    return hmac.new(_PIN_KEY, str(until).encode(), hashlib.sha256).hexdigest()[:32]
+
+
+def _cookie_pinned(header: str, window: float) -> bool:
+    """Whether the Cookie header carries a pin we issued that has not expired; forged or
+    tampered values, and ones reaching further out than a fresh pin would, are ignored."""
+    for part in header.split(";"):
+        name, _, value = part.strip().partition("=")
+        if name != PIN_COOKIE:
+            continue
+        until, _, signature = value.partition(".")
+        try:
+            until_at = int(until)
+        except ValueError:
+            return False
+        now = time.time()
+        return hmac.compare_digest(signature, _pin_signature(until_at)) and now < until_at <= now + window + 1
+    return False
 
 
 def get_session() -> Generator[Session, None, None]:
+    """Session on the primary, for handlers that write."""
     if _engine is None:
         init_engine()
     with Session(_engine) as session:
         yield session
+
+
+def get_read_session() -> Generator[Session, None, None]:
+    """Session on a replica (the primary when there are none or the client is pinned to it)."""
+    if _engine is None:
+        init_engine()
+    token = _mode.set("read")
+    try:
+        index = _pick_replica()
+    finally:
+        _mode.reset(token)
+    with Session(_engine if index is None else _replicas[index]) as session:
+        yield session
+
+
+async def run(fn: Callable[..., T], *args) -> T:
+    """Run `fn(session, *args)` without blocking the event loop.
+
+    With the async engine the function runs on an AsyncSession's connection via
+    `run_sync`; otherwise it runs in the threadpool with a regular Session. Inside a
+    handler annotated with `@reads` it runs on a read replica when one is configured.
+    """
+    if _engine is None:
+        init_engine()
+    index = _pick_replica()
+    if index is None:
+        return await _run(_engine, _async_engine, fn, *args)
+    _in_flight[index] += 1
+    try:
+        return await _run(_replicas[index], _async_replicas[index], fn, *args)
+    finally:
+        _in_flight[index] -= 1
+
+
+async def run_write(fn: Callable[..., T], *args) -> T:
+    """`run` on the primary for the occasional write inside a `@reads` handler; pins the client like `@writes`."""
+    token = _mode.set("write")
+    try:
+        result = await run(fn, *args)
+    finally:
+        _mode.reset(token)
+    _wrote()
+    return result
+
+
+async def _run(engine: Engine, async_engine, fn: Callable[..., T], *args) -> T:
+    if async_engine is not None:
+        async with AsyncSession(async_engine) as session:
+            # check the connection out up front so the pool wait is measured on its own
+            started = time.perf_counter()
+            await session.connection()
+            metrics.POOL_WAIT.observe(time.perf_counter() - started)
+            return await session.run_sync(fn, *args)
+    return await run_in_threadpool(_run_in_session, fn, *args, engine=engine)
+
+
+def run_sync(fn: Callable[..., T], *args) -> T:
+    """Run `fn(session, *args)` on the primary's sync engine, for background threads and scripts."""
+    if _engine is None:
+        init_engine()
+    return _run_in_session(fn, *args)
+
+
+def _run_in_session(fn: Callable[..., T], *args, engine: Optional[Engine] = None) -> T:
+    with Session(engine if engine is not None else _engine) as session:
+        started = time.perf_counter()
+        session.connection()
+        metrics.POOL_WAIT.observe(time.perf_counter() - started)
+        return fn(session, *args)
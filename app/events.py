@@ -0,0 +1,145 @@
+"""In-process broadcast hub for live feed events, streamed to browsers as server-sent events."""
+import asyncio
+import itertools
+import os
+import threading
+from typing import AsyncIterator, Dict, Optional, Set
+
+import orjson
+
+QUEUE_SIZE = int(os.environ.get("VIBE_EVENTS_QUEUE_SIZE", "100"))
+HEARTBEAT = float(os.environ.get("VIBE_EVENTS_HEARTBEAT", "15"))
+# EventSource reconnect delay the server asks clients to use, in milliseconds
+RETRY_MS = int(os.environ.get("VIBE_EVENTS_RETRY_MS", "3000"))
+
+# end-of-stream marker put on a subscriber's queue when it is dropped or the hub closes
+_CLOSE = None
+
+
+class Subscriber:
+    """One connected client: a bounded queue of encoded frames owned by the loop that reads it."""
+
+    def __init__(self, queue_size: int, loop: Optional[asyncio.AbstractEventLoop]):
+        self.queue: "asyncio.Queue[Optional[bytes]]" = asyncio.Queue(queue_size)
+        self.loop = loop
+        self.closed = False
+
+    def _offer(self, frame: Optional[bytes]) -> bool:
+        """Queue `frame`; returns False when the queue is full (the client is not keeping up)."""
+        if self.closed:
+            return True
+        if frame is _CLOSE:
+            self._close()
+            return True
+        try:
+            self.queue.put_nowait(frame)
+            return True
+        except asyncio.QueueFull:
+            self._close()
+            return False
+
+    def _close(self) -> None:
+        # make room for the marker: whatever is still queued is stale once the client has to resync
+        self.closed = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(_CLOSE)
+
+
+class Hub:
+    """Fans each published event out to every subscriber without ever blocking the publisher.
+
+    Every subscriber has its own bounded queue; a subscriber whose queue is full is dropped
+    (its stream ends and the browser reconnects and reloads) instead of slowing everyone down.
+    """
+
+    def __init__(self, queue_size: int = QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._subscribers: Set[Subscriber] = set()
+        self._ids = itertools.count(1)
+        self.published = 0
+        self.dropped = 0
+
+    @classmethod
+    def from_env(cls) -> "Hub":
+        return cls(QUEUE_SIZE)
+
+    def subscribe(self) -> Subscriber:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        subscriber = Subscriber(self.queue_size, loop)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, event: str, data) -> int:
+        """Send `data` (anything orjson can encode) as an `event` frame to every subscriber.
+
+        The frame is encoded once and shared. Returns the number of subscribers it was offered to.
+        """
+        event_id = next(self._ids)
+        frame = b"id: %d\nevent: %s\ndata: %s\n\n" % (event_id, event.encode(), orjson.dumps(data))
+        self.published += 1
+        return self._deliver(frame)
+
+    def close(self) -> None:
+        """End every open stream, e.g. on shutdown."""
+        self._deliver(_CLOSE)
+
+    def _deliver(self, frame: Optional[bytes]) -> int:
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            if subscriber.loop is None or _running_loop() is subscriber.loop:
+                self._offer(subscriber, frame)
+            else:
+                # asyncio queues are not thread-safe; hand the frame to the subscriber's own loop
+                try:
+                    subscriber.loop.call_soon_threadsafe(self._offer, subscriber, frame)
+                except RuntimeError:  # loop already closed
+                    self.unsubscribe(subscriber)
+        return len(subscribers)
+
+    def _offer(self, subscriber: Subscriber, frame: Optional[bytes]) -> None:
+        if not subscriber._offer(frame):
+            self.dropped += 1
+            self.unsubscribe(subscriber)
+
+    def stats(self) -> Dict[str, int]:
+        return {"subscribers": len(self._subscribers), "published": self.published, "dropped": self.dropped}
+
+
+def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+async def stream(hub: Hub, heartbeat: float = HEARTBEAT) -> AsyncIterator[bytes]:
+    """Yield SSE frames for one client until it is dropped, the hub closes or the client goes away."""
+    subscriber = hub.subscribe()
+    try:
+        # sent right away so proxies and the browser see the response start before the first event
+        yield b"retry: %d\n\n" % RETRY_MS
+        while True:
+            try:
+                frame = await asyncio.wait_for(subscriber.queue.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                yield b": ping\n\n"
+                continue
+            if frame is _CLOSE:
+                return
+            yield frame
+    finally:
+        hub.unsubscribe(subscriber)
+
+
+hub = Hub.from_env()
@@ -0,0 +1,154 @@
+"""Like/unlike writes: idempotent inserts against the unique (user_id, post_id) index and an optional
+write-behind buffer that coalesces likes in memory and applies them in batched transactions."""
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import delete
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import aliased
+from sqlmodel import Session, select
+
+from app import models
+
+BUFFER_ENABLED = os.environ.get("VIBE_LIKE_BUFFER", "0").lower() in ("1", "true", "yes")
+FLUSH_INTERVAL = float(os.environ.get("VIBE_LIKE_FLUSH_MS", "200")) / 1000
+FLUSH_SIZE = int(os.environ.get("VIBE_LIKE_FLUSH_SIZE", "500"))
+
+_like = models.Like.__table__
+_insert_like = sqlite_insert(_like).on_conflict_do_nothing(index_elements=["user_id", "post_id"])
+
+# (user_id, post_id) -> True for like, False for unlike
+Changes = Dict[Tuple[int, int], bool]
+
+
+def post_authors(session: Session, post_ids: Iterable[int]) -> Dict[int, Tuple[int, Optional[int]]]:
+    """post_id -> (author_id, parent's author_id) for the posts that exist, in one query.
+
+    A like changes the post's author's profile and, for a reply, the parent author's profile too.
+    """
+    parent = aliased(models.Post)
+    stmt = (
+        select(models.Post.id, models.Post.author_id, parent.author_id)
+        .outerjoin(parent, parent.id == models.Post.parent_id)
+        .where(models.Post.id.in_(set(post_ids)))
+    )
+    return {pid: (author, parent_author) for pid, author, parent_author in session.exec(stmt).all()}
+
+
+def apply(session: Session, changes: Changes) -> Dict[Tuple[int, int], int]:
+    """Insert likes (ignoring ones that exist) and delete unlikes. Returns +1/-1 for each pair that changed.
+
+    One statement per pair so each rowcount says exactly whether that row changed; with a
+    pre-check SELECT, two concurrent likes of the same pair would both bump the counter.
+    """
+    now = datetime.now(timezone.utc)
+    changed: Dict[Tuple[int, int], int] = {}
+    for (user_id, post_id), liked in changes.items():
+        if liked:
+            hit = session.execute(_insert_like.values(user_id=user_id, post_id=post_id, created_at=now)).rowcount
+        else:
+            hit = session.execute(delete(_like).where(_like.c.user_id == user_id, _like.c.post_id == post_id)).rowcount
+        if hit:
+            changed[(user_id, post_id)] = 1 if liked else -1
+    return changed
+
+
+def post_deltas(changed: Dict[Tuple[int, int], int]) -> Dict[int, int]:
+    deltas: Dict[int, int] = {}
+    for (_, post_id), delta in changed.items():
+        deltas[post_id] = deltas.get(post_id, 0) + delta
+    return {pid: d for pid, d in deltas.items() if d}
+
+
+class LikeBuffer:
+    """Coalesces like/unlike requests in memory and hands them to `flush_fn` in batches.
+
+    A batch is flushed every `interval` seconds, as soon as `size` pairs are pending, and on
+    `close()`. For each (user, post) pair only the last request counts. A batch whose flush fails
+    goes back into the buffer and is retried on the next tick. After `close()`, `add()` writes
+    through synchronously. Likes still in the buffer are lost if the process dies, which is the
+    price of taking them off the writer lock.
+    """
+
+    def __init__(self, flush_fn: Callable[[Changes], None], interval: Optional[float] = None, size: Optional[int] = None):
+        self.flush_fn = flush_fn
+        # module settings are read here, not bound as defaults, so they can be changed at runtime
+        self.interval = FLUSH_INTERVAL if interval is None else interval
+        self.size = FLUSH_SIZE if size is None else size
+        self._lock = threading.Lock()
+        # serializes flushes so batches are applied in the order they were taken
+        self._flush_lock = threading.Lock()
+        self._pending: Changes = {}
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+        self.flushed = 0
+        self.flushes = 0
+
+    def add(self, user_id: int, post_id: int, liked: bool = True) -> None:
+        self._start()
+        with self._lock:
+            self._pending[(user_id, post_id)] = liked
+            full = len(self._pending) >= self.size
+        if self._closed:
+            # no flusher thread any more
+            self.flush()
+        elif full:
+            self._wake.set()
+
+    def flush(self) -> int:
+        """Apply everything pending now. Returns the number of pairs handed to `flush_fn`."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if batch:
+                try:
+                    self.flush_fn(batch)
+                except BaseException:
+                    with self._lock:
+                        # requests that arrived meanwhile are newer and win
+                        for pair, liked in batch.items():
+                            self._pending.setdefault(pair, liked)
+                    raise
+                self.flushed += len(batch)
+                self.flushes += 1
+            return len(batch)
+
+    def close(self, attempts: int = 3) -> None:
+        """Stop the background flusher and flush what is left, retrying a failed flush up to `attempts` times."""
+        self._closed = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+        for attempt in range(attempts):
+            try:
+                self.flush()
+                return
+            except Exception:
+                if attempt + 1 == attempts:
+                    raise
+                time.sleep(self.interval)
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def _start(self) -> None:
+        if self._thread is not None or self._closed:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="like-flusher", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while not self._closed:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                from app import logger
+                logger.get_logger().exception("like_flush_failed")
@@ -1,29 +1,109 @@
+import atexit
 import logging
+import logging.handlers
+import queue
 from pythonjsonlogger import jsonlogger
 import os
 
-LOG_DIR = os.path.join(os.path.dirname(__file__), "..", "logs")
+LOG_DIR = os.environ.get("VIBE_LOG_DIR", os.path.join(os.path.dirname(__file__), "..", "logs"))
 os.makedirs(LOG_DIR, exist_ok=True)
 
+LOG_MAX_BYTES = int(os.environ.get("VIBE_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUPS = int(os.environ.get("VIBE_LOG_BACKUPS", "5"))
+LOG_QUEUE_SIZE = int(os.environ.get("VIBE_LOG_QUEUE_SIZE", "10000"))
+LOG_MARKDOWN = os.environ.get("VIBE_LOG_MARKDOWN", "1").lower() in ("1", "true", "yes")
+LOG_CONSOLE = os.environ.get("VIBE_LOG_CONSOLE", "1").lower() in ("1", "true", "yes")
+
+# attributes every LogRecord has; anything else came in through `extra=` and is a structured field
+_RESERVED = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class FieldsFormatter(logging.Formatter):
+    """Plain-text formatter that renders structured `extra=` fields as `key=value` pairs."""
+
+    fields_separator = " "
+
+    def format(self, record):
+        text = super().format(record)
+        fields = {k: v for k, v in vars(record).items() if k not in _RESERVED}
+        if fields:
+            text += self.fields_separator + " ".join(f"{k}={v}" for k, v in fields.items())
+        return text
+
+
+class MarkdownFormatter(FieldsFormatter):
+    fields_separator = "- fields: "
+
+    def __init__(self):
+        super().__init__('### %(levelname)s - %(asctime)s\n- logger: %(name)s\n- msg: %(message)s\n')
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Never blocks the caller: when the queue is full the record is dropped and counted."""
+
+    dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DroppingQueueHandler.dropped += 1
+
+
+def _sinks():
+    # JSON handler
+    json_handler = logging.handlers.RotatingFileHandler(
+        os.path.join(LOG_DIR, "app.log.json"), maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS)
+    json_handler.setFormatter(jsonlogger.JsonFormatter('%(asctime)s %(levelname)s %(name)s %(message)s'))
+    sinks = [json_handler]
+
+    # Markdown handler: simple text to a .md file
+    if LOG_MARKDOWN:
+        md_handler = logging.handlers.RotatingFileHandler(
+            os.path.join(LOG_DIR, "app.log.md"), maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS)
+        md_handler.setFormatter(MarkdownFormatter())
+        sinks.append(md_handler)
+
+    # Console handler for convenience
+    if LOG_CONSOLE:
+        console = logging.StreamHandler()
+        console.setFormatter(FieldsFormatter('%(levelname)s: %(message)s'))
+        sinks.append(console)
+    return sinks
+
+
 logger = logging.getLogger("vibe")
 logger.setLevel(logging.INFO)
 
-# JSON handler
-json_handler = logging.FileHandler(os.path.join(LOG_DIR, "app.log.json"))
-json_formatter = jsonlogger.JsonFormatter('%(asctime)s %(levelname)s %(name)s %(message)s')
-json_handler.setFormatter(json_formatter)
+# request threads only enqueue; a background listener does the formatting and file I/O
+_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(LOG_QUEUE_SIZE)
+_handler = DroppingQueueHandler(_queue)
+_listener = None
+
+
+def startup():
+    """Attach the queue handler and start the background writer, unless already running."""
+    global _listener
+    if _listener is None:
+        _listener = logging.handlers.QueueListener(_queue, *_sinks(), respect_handler_level=True)
+        _listener.start()
+        logger.addHandler(_handler)
+
+
+def shutdown():
+    """Detach the queue handler, flush queued records and stop the background writer."""
+    global _listener
+    if _listener is not None:
+        logger.removeHandler(_handler)
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
 
-# Markdown handler: simple text to a .md file
-md_handler = logging.FileHandler(os.path.join(LOG_DIR, "app.log.md"))
-md_handler.setFormatter(logging.Formatter('### %(levelname)s - %(asctime)s\n- logger: %(name)s\n- msg: %(message)s\n'))
 
-# Console handler for convenience
-console = logging.StreamHandler()
-console.setFormatter(logging.Formatter('%(levelname)s: %(message)s'))
+startup()
+atexit.register(shutdown)
 
-logger.addHandler(json_handler)
-logger.addHandler(md_handler)
-logger.addHandler(console)
 
 def get_logger():
     return logger
@@ -1,155 +1,599 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, status
+from fastapi.responses import ORJSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlmodel import Session, select
-from typing import List
+from sqlalchemy import bindparam, delete, union_all, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from datetime import datetime, timezone
 import os
-from app import db, models, schemas, auth, logger, ratelimit
-from fastapi.staticfiles import StaticFiles
+from app import db, models, schemas, archive, assets, auth, cache, compression, events, likes, logger, metrics, pagination, passwords, ratelimit, search, timeline, versions
 
 RL_MAX = int(os.environ.get("VIBE_RL_MAX", "3"))
 RL_WINDOW = int(os.environ.get("VIBE_RL_WINDOW", "60"))
+# batch endpoints are charged per item against a separate, larger budget
+RL_BATCH_ITEMS = int(os.environ.get("VIBE_RL_BATCH_ITEMS", "500"))
+CACHE_SIZE = int(os.environ.get("VIBE_CACHE_SIZE", "256"))
+CACHE_TTL = float(os.environ.get("VIBE_CACHE_TTL", "5"))
 
-app = FastAPI(title="Vibe - Microblog")
+# read-through cache for feed/profile pages; entries are tagged "feed" or "user:<id>"
+read_cache = cache.TTLCache(maxsize=CACHE_SIZE, ttl=CACHE_TTL)
+# feed/profile responses carry an ETag; clients may reuse them for READ_MAX_AGE seconds, then must revalidate
+READ_MAX_AGE = int(os.environ.get("VIBE_READ_MAX_AGE", "0"))
+READ_CACHE_CONTROL = f"public, max-age={READ_MAX_AGE}, must-revalidate"
+# posts embed at most this many of their replies unless `include_replies` asks otherwise
+REPLY_PREVIEW = int(os.environ.get("VIBE_REPLY_PREVIEW", "3"))
+MAX_REPLY_PREVIEW = 20
+INCLUDE_REPLIES = Query(
+    f"preview:{REPLY_PREVIEW}" if REPLY_PREVIEW > 0 else "count", regex=r"^(none|count|preview:[1-9]\d*)$",
+    description=f"`none` (no reply fields), `count` (`reply_count` only) or `preview:N` (`reply_count` and the first N >= 1 replies, at most {MAX_REPLY_PREVIEW}). The rest of a thread is paged with `/posts/{{id}}/replies`.",
+)
+
+app = FastAPI(title="Vibe - Microblog", default_response_class=ORJSONResponse)
+app.add_middleware(db.ReadYourWritesMiddleware, window=db.READ_YOUR_WRITES_SECONDS)
+app.add_middleware(compression.CompressionMiddleware, minimum_size=compression.MINIMUM_SIZE)
+# outermost, so latency includes compression
+app.add_middleware(metrics.MetricsMiddleware, slow_request_ms=metrics.SLOW_REQUEST_MS)
 log = logger.get_logger()
 
 import warnings
 # Reduce noisy deprecation warnings from third-party libs that we can't control here.
 warnings.filterwarnings("ignore", category=DeprecationWarning, message=".*crypt is deprecated.*")
 
-# Serve the simple frontend at /ui
-app.mount("/ui", StaticFiles(directory="frontend", html=True), name="ui")
+# Serve the simple frontend at /ui (the fingerprinted build from scripts/build_frontend.py when present)
+app.mount("/ui", assets.AssetFiles(directory=assets.ui_directory(), html=True), name="ui")
 
 
 @app.on_event("startup")
 def on_startup():
+    logger.startup()
     db.init_db()
     log.info("database_initialized")
 
 
+@app.on_event("shutdown")
+def on_shutdown():
+    if like_buffer is not None:
+        like_buffer.close()
+    events.hub.close()
+    passwords.service.shutdown()
+    logger.shutdown()
+
+
 @app.post("/register", response_model=schemas.Token, summary="Register a new user", description="Create a new user account and return an access token.")
-def register(user: schemas.UserCreate):
-    with next(db.get_session()) as session:
+@db.writes
+async def register(user: schemas.UserCreate):
+    hashed = await auth.hash_password(user.password)
+
+    def create(session: Session) -> models.User:
         statement = select(models.User).where(models.User.username == user.username)
         existing = session.exec(statement).first()
         if existing:
             raise HTTPException(status_code=400, detail="username already taken")
-        hashed = auth.get_password_hash(user.password)
         new_user = models.User(username=user.username, display_name=user.display_name, hashed_password=hashed)
         session.add(new_user)
         session.commit()
         session.refresh(new_user)
-        access = auth.create_access_token({"sub": new_user.username})
-        log.info(f"user_registered: {new_user.username}")
-        return {"access_token": access, "token_type": "bearer"}
+        return new_user
+
+    new_user = await db.run(create)
+    access = auth.create_user_token(new_user)
+    log.info("user_registered", extra={"username": new_user.username})
+    return {"access_token": access, "token_type": "bearer"}
 
 
 @app.post("/token", response_model=schemas.Token, summary="User login (OAuth2)", description="Obtain an access token using username and password (form-data). Use returned bearer token for authenticated endpoints.")
-def login(form_data: OAuth2PasswordRequestForm = Depends()):
-    with next(db.get_session()) as session:
-        user = auth.authenticate_user(session, form_data.username, form_data.password)
-        if not user:
-            raise HTTPException(status_code=400, detail="Incorrect username or password")
-        token = auth.create_access_token({"sub": user.username})
-        log.info(f"user_login: {user.username}")
-        return {"access_token": token, "token_type": "bearer"}
+@db.reads
+async def login(form_data: OAuth2PasswordRequestForm = Depends()):
+    user = await auth.authenticate_user(form_data.username, form_data.password)
+    if not user:
+        raise HTTPException(status_code=400, detail="Incorrect username or password")
+    token = auth.create_user_token(user)
+    log.info("user_login", extra={"username": user.username})
+    return {"access_token": token, "token_type": "bearer"}
 
 
 @app.post("/posts", response_model=schemas.PostOut, summary="Create a post", description="Create a short text post (reply via `parent_id` for one-level replies). Requires Bearer token.")
-def create_post(payload: schemas.PostCreate, current_user: models.User = Depends(auth.get_current_user), _rate=Depends(ratelimit.rate_limit(max_requests=RL_MAX, window_seconds=RL_WINDOW))):
-    with next(db.get_session()) as session:
+@db.writes
+async def create_post(payload: schemas.PostCreate, current_user: models.User = Depends(auth.get_current_user), _rate=Depends(ratelimit.rate_limit(max_requests=RL_MAX, window_seconds=RL_WINDOW))):
+    def create(session: Session):
+        parent = None
         # enforce one-level reply depth
         if payload.parent_id is not None:
-            parent = session.get(models.Post, payload.parent_id)
+            parent = _load_posts(session, [payload.parent_id]).get(payload.parent_id)
             if not parent:
                 raise HTTPException(status_code=404, detail="parent post not found")
             if parent.parent_id is not None:
                 raise HTTPException(status_code=400, detail="cannot reply more than one level deep")
         post = models.Post(author_id=current_user.id, content=payload.content, parent_id=payload.parent_id)
         session.add(post)
+        if parent is not None:
+            session.exec(update(models.Post).where(models.Post.id == parent.id).values(reply_count=models.Post.reply_count + 1))
+        session.flush()
+        timeline.fan_out(session, [post])
+        tags = _record_write(session, current_user.id, parent.author_id if parent is not None else None)
         session.commit()
+        read_cache.invalidate(*tags)
         session.refresh(post)
-        log.info(f"post_created: {post.id} by {current_user.username}")
-        return _post_out(session, post)
+        return _hydrate_posts(session, [post])[0]
 
-@app.get("/feed", response_model=List[schemas.PostOut], summary="Global feed", description="Return a chronological global feed. Supports pagination via `page` (0-indexed) and `page_size`.")
-def feed(page: int = 0, page_size: int = 50, session: Session = Depends(db.get_session)):
+    out = await db.run(create)
+    log.info("post_created", extra={"post_id": out["id"], "username": current_user.username})
+    events.hub.publish("post", out)
+    return _json(out)
+
+@app.get("/feed", response_model=List[schemas.PostOut], summary="Global feed", description="Return a chronological global feed. Paginate with the opaque `cursor` returned in the `X-Next-Cursor` header, or with the legacy `page` (0-indexed) and `page_size`.")
+@db.reads
+async def feed(request: Request, page: int = 0, page_size: int = 50, cursor: Optional[str] = None, include_replies: str = INCLUDE_REPLIES):
     page_size = min(100, max(1, page_size))
-    offset = max(0, page) * page_size
-    statement = select(models.Post).order_by(models.Post.created_at.desc()).offset(offset).limit(page_size)
-    posts = session.exec(statement).all()
-    result = [_post_out(session, p) for p in posts]
-    return result
-
-
-@app.post("/posts/{post_id}/like", summary="Like a post", description="Like a post by id. Requires Bearer token. Duplicate likes are rejected.")
-def like_post(post_id: int, current_user: models.User = Depends(auth.get_current_user), _rate=Depends(ratelimit.rate_limit(max_requests=RL_MAX, window_seconds=RL_WINDOW))):
-    with next(db.get_session()) as session:
-        post = session.get(models.Post, post_id)
-        if not post:
+    page = None if cursor else max(0, page)
+    replies = _reply_mode(include_replies)
+    validator = await db.run(versions.read, "feed")
+    if versions.not_modified(request, validator):
+        return versions.not_modified_response(validator, READ_CACHE_CONTROL)
+
+    def load(session: Session):
+        posts = archive.newest_first(session, cursor, page_size, offset=page * page_size if page else 0)
+        return (_hydrate_posts(session, posts, replies), pagination.next_cursor(posts, page_size)), ["feed"]
+
+    out_posts, next_cursor = await _cached(("feed", validator.version, cursor, page, page_size, replies), load)
+    response = _json(out_posts, next_cursor)
+    versions.set_headers(response, validator, READ_CACHE_CONTROL)
+    return response
+
+
+@app.get("/events", summary="Live feed events", description="Server-sent event stream of feed changes: `post` events carry a new post (same shape as in `/feed`), `like` events carry `{post_id, delta}`. A client that falls too far behind is disconnected and should reload `/feed` when it reconnects. A `: ping` comment is sent when the stream is idle.", response_class=StreamingResponse)
+async def live_events():
+    return StreamingResponse(events.stream(events.hub), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.post("/posts/{post_id}/like", summary="Like a post", description="Like a post by id. Requires Bearer token. Liking a post you already like changes nothing and still succeeds.")
+@db.writes
+async def like_post(post_id: int, current_user: models.User = Depends(auth.get_current_user), _rate=Depends(ratelimit.rate_limit(max_requests=RL_MAX, window_seconds=RL_WINDOW))):
+    await _set_like(current_user, post_id, True)
+    log.info("post_liked", extra={"post_id": post_id, "username": current_user.username})
+    return {"status": "ok"}
+
+
+@app.delete("/posts/{post_id}/like", summary="Unlike a post", description="Remove your like from a post. Requires Bearer token. Unliking a post you do not like changes nothing and still succeeds.")
+@db.writes
+async def unlike_post(post_id: int, current_user: models.User = Depends(auth.get_current_user), _rate=Depends(ratelimit.rate_limit(max_requests=RL_MAX, window_seconds=RL_WINDOW))):
+    await _set_like(current_user, post_id, False)
+    log.info("post_unliked", extra={"post_id": post_id, "username": current_user.username})
+    return {"status": "ok"}
+
+
+async def _set_like(user: models.User, post_id: int, liked: bool) -> None:
+    """Like or unlike `post_id`, directly or through the write-behind buffer when it is enabled."""
+    def change(session: Session) -> Dict[int, int]:
+        if like_buffer is not None:
+            # an archived post is restored by the flush, in the transaction that writes the like
+            if post_id not in likes.post_authors(session, [post_id]) and not archive.archived_ids(session, [post_id]):
+                raise HTTPException(status_code=404, detail="post not found")
+            like_buffer.add(user.id, post_id, liked)
+            return {}
+        authors = _post_authors(session, [post_id])
+        if post_id not in authors:
             raise HTTPException(status_code=404, detail="post not found")
-        # prevent duplicate likes
-        statement = select(models.Like).where(models.Like.user_id == current_user.id, models.Like.post_id == post_id)
-        existing = session.exec(statement).first()
-        if existing:
-            raise HTTPException(status_code=400, detail="already liked")
-        like = models.Like(user_id=current_user.id, post_id=post_id)
-        session.add(like)
+        return _apply_likes(session, {(user.id, post_id): liked}, authors)
+
+    _publish_likes(await db.run(change))
+
+
+def _apply_likes(session: Session, changes: likes.Changes, authors: Optional[Dict[int, Tuple[int, Optional[int]]]] = None) -> Dict[int, int]:
+    """Apply like changes, adjust the counters and commit. Returns the like-count delta per post.
+
+    Without `authors`, archived posts are restored first and changes to posts that no longer
+    exist are dropped, so one stale pair cannot fail a whole buffered batch.
+    """
+    if authors is None:
+        authors = _post_authors(session, {post_id for _, post_id in changes})
+    changes = {pair: liked for pair, liked in changes.items() if pair[1] in authors}
+    deltas = likes.post_deltas(likes.apply(session, changes))
+    if not deltas:
+        session.rollback()
+        return {}
+    _bump_counters(session, "like_count", deltas)
+    # a reply's like count is also shown under its parent on the parent author's profile
+    tags = _record_write(session, *(author for pid in deltas for author in authors[pid]))
+    session.commit()
+    read_cache.invalidate(*tags)
+    return deltas
+
+
+def _publish_likes(deltas: Dict[int, int]) -> None:
+    for post_id, delta in deltas.items():
+        events.hub.publish("like", {"post_id": post_id, "delta": delta})
+
+
+def _flush_likes(changes: likes.Changes) -> None:
+    _publish_likes(db.run_sync(_apply_likes, changes))
+
+
+# likes are coalesced in memory and written in batches when VIBE_LIKE_BUFFER is on
+like_buffer = likes.LikeBuffer(_flush_likes) if likes.BUFFER_ENABLED else None
+
+
+@app.post("/posts/batch", response_model=List[schemas.PostBatchItem], summary="Create posts in bulk", description=f"Create up to {schemas.MAX_BATCH_ITEMS} posts in one transaction. Each item gets its own result; invalid items (unknown parent, reply to a reply) are reported and skipped. Charged per item against the batch rate limit. Requires Bearer token.")
+@db.writes
+async def create_posts_batch(payload: schemas.PostBatchCreate, current_user: models.User = Depends(auth.get_current_user), charge=Depends(ratelimit.batch_rate_limit(max_items=RL_BATCH_ITEMS, window_seconds=RL_WINDOW))):
+    charge(len(payload.posts))
+
+    def create(session: Session) -> List[Dict[str, Any]]:
+        parent_ids = {p.parent_id for p in payload.posts if p.parent_id is not None}
+        parents = {}
+        if parent_ids:
+            parents = _load_posts(session, parent_ids)
+        results: List[Dict[str, Any]] = []
+        created: List[models.Post] = []
+        for index, item in enumerate(payload.posts):
+            error = None
+            if item.parent_id is not None:
+                parent = parents.get(item.parent_id)
+                if parent is None:
+                    error = "parent post not found"
+                elif parent.parent_id is not None:
+                    error = "cannot reply more than one level deep"
+            results.append({"index": index, "ok": error is None, "post": None, "error": error})
+            if error is None:
+                created.append(models.Post(author_id=current_user.id, content=item.content, parent_id=item.parent_id))
+        if not created:
+            return results
+        session.add_all(created)
+        replies_per_parent: Dict[int, int] = {}
+        for post in created:
+            if post.parent_id is not None:
+                replies_per_parent[post.parent_id] = replies_per_parent.get(post.parent_id, 0) + 1
+        if replies_per_parent:
+            _bump_counters(session, "reply_count", replies_per_parent)
+        session.flush()
+        timeline.fan_out(session, created)
+        # hydrate before commit: committing expires the new rows and would reload them one by one
+        out = iter(_hydrate_posts(session, created, replies=0))
+        tags = _record_write(session, current_user.id, *(parents[pid].author_id for pid in replies_per_parent))
+        session.commit()
+        read_cache.invalidate(*tags)
+        for result in results:
+            if result["ok"]:
+                result["post"] = next(out)
+        return results
+
+    results = await db.run(create)
+    log.info("posts_batch_created", extra={"posts_ok": sum(r["ok"] for r in results), "posts_failed": sum(not r["ok"] for r in results), "username": current_user.username})
+    for result in results:
+        if result["ok"]:
+            events.hub.publish("post", result["post"])
+    return _json(results)
+
+
+@app.post("/likes/batch", response_model=List[schemas.LikeBatchItem], summary="Like posts in bulk", description=f"Like up to {schemas.MAX_BATCH_ITEMS} posts in one transaction. Unknown posts and posts already liked are reported per item. Charged per item against the batch rate limit. Requires Bearer token.")
+@db.writes
+async def like_posts_batch(payload: schemas.LikeBatchCreate, current_user: models.User = Depends(auth.get_current_user), charge=Depends(ratelimit.batch_rate_limit(max_items=RL_BATCH_ITEMS, window_seconds=RL_WINDOW))):
+    charge(len(payload.post_ids))
+
+    def like(session: Session):
+        authors = _post_authors(session, payload.post_ids)
+        # the batch is already one transaction, so it bypasses the write-behind buffer
+        pairs = {(current_user.id, post_id): True for post_id in payload.post_ids if post_id in authors}
+        deltas = _apply_likes(session, pairs, authors) if pairs else {}
+        results: List[Dict[str, Any]] = []
+        reported = set()
+        for post_id in payload.post_ids:
+            if post_id not in authors:
+                error = "post not found"
+            elif post_id in deltas and post_id not in reported:
+                error = None
+                reported.add(post_id)
+            else:
+                # liked before, or a repeated id in the same batch
+                error = "already liked"
+            results.append({"post_id": post_id, "ok": error is None, "error": error})
+        return results, deltas
+
+    results, deltas = await db.run(like)
+    log.info("likes_batch_created", extra={"likes_ok": sum(r["ok"] for r in results), "likes_failed": sum(not r["ok"] for r in results), "username": current_user.username})
+    _publish_likes(deltas)
+    return _json(results)
+
+
+_insert_follow = sqlite_insert(models.Follow.__table__).on_conflict_do_nothing(index_elements=["follower_id", "followee_id"])
+
+
+@app.post("/users/{username}/follow", summary="Follow a user", description="Follow a user so their posts appear in your `/timeline`. Requires Bearer token.")
+@db.writes
+async def follow(username: str, current_user: models.User = Depends(auth.get_current_user), _rate=Depends(ratelimit.rate_limit(max_requests=RL_MAX, window_seconds=RL_WINDOW))):
+    def create(session: Session):
+        followee = _get_user_or_404(session, username)
+        if followee.id == current_user.id:
+            raise HTTPException(status_code=400, detail="cannot follow yourself")
+        # the unique index decides, so two concurrent follows cannot both bump the counter
+        inserted = session.execute(_insert_follow.values(
+            follower_id=current_user.id, followee_id=followee.id, created_at=datetime.now(timezone.utc))).rowcount
+        if not inserted:
+            raise HTTPException(status_code=400, detail="already following")
+        session.exec(update(models.User).where(models.User.id == followee.id).values(follower_count=models.User.follower_count + 1))
+        timeline.backfill_follow(session, current_user.id, followee)
+        session.commit()
+
+    await db.run(create)
+    log.info("user_followed", extra={"username": current_user.username, "followee": username})
+    return {"status": "ok"}
+
+
+@app.delete("/users/{username}/follow", summary="Unfollow a user", description="Stop following a user and remove their posts from your `/timeline`. Requires Bearer token.")
+@db.writes
+async def unfollow(username: str, current_user: models.User = Depends(auth.get_current_user), _rate=Depends(ratelimit.rate_limit(max_requests=RL_MAX, window_seconds=RL_WINDOW))):
+    def remove(session: Session):
+        followee = _get_user_or_404(session, username)
+        deleted = session.execute(delete(models.Follow).where(
+            models.Follow.follower_id == current_user.id, models.Follow.followee_id == followee.id)).rowcount
+        if not deleted:
+            raise HTTPException(status_code=404, detail="not following")
+        session.exec(update(models.User).where(models.User.id == followee.id).values(follower_count=models.User.follower_count - 1))
+        timeline.remove_author(session, current_user.id, followee.id)
         session.commit()
-        log.info(f"post_liked: {post_id} by {current_user.username}")
-        return {"status": "ok"}
+
+    await db.run(remove)
+    log.info("user_unfollowed", extra={"username": current_user.username, "followee": username})
+    return {"status": "ok"}
+
+
+@app.get("/timeline", response_model=List[schemas.PostOut], summary="Home timeline", description="Posts from you and the accounts you follow, newest first. Paginate with the opaque `cursor` returned in the `X-Next-Cursor` header. Requires Bearer token.")
+@db.reads
+async def home_timeline(cursor: Optional[str] = None, page_size: int = 50, current_user: models.User = Depends(auth.get_current_user)):
+    page_size = min(100, max(1, page_size))
+
+    def load(session: Session):
+        posts, next_cursor = timeline.page(session, current_user.id, cursor, page_size)
+        return _hydrate_posts(session, posts), next_cursor
+
+    out_posts, next_cursor = await db.run(load)
+    return _json(out_posts, next_cursor)
+
+
+@app.get("/search", response_model=List[schemas.PostOut], summary="Search posts", description="Full-text search over post content, best matches first. All words must match; end a word with `*` for a prefix match (`hel*`). Paginate with the opaque `cursor` returned in the `X-Next-Cursor` header.")
+@db.reads
+async def search_posts(q: str, cursor: Optional[str] = None, page_size: int = 20):
+    page_size = min(100, max(1, page_size))
+
+    def load(session: Session):
+        if not search.supported(session):
+            raise HTTPException(status_code=501, detail="search requires SQLite FTS5")
+        posts, next_cursor = search.query(session, q, cursor, page_size)
+        return _hydrate_posts(session, posts), next_cursor
+
+    out_posts, next_cursor = await db.run(load)
+    return _json(out_posts, next_cursor)
 
 
-@app.get("/users/{username}", response_model=schemas.ProfileOut, summary="User profile", description="View a user's profile and their posts in chronological order.")
-def profile(username: str, session: Session = Depends(db.get_session)):
+def _bump_counters(session: Session, column: str, deltas: Dict[int, int]) -> None:
+    """Add deltas[post_id] to Post.<column> for every post in one executemany UPDATE."""
+    counter = getattr(models.Post, column)
+    stmt = update(models.Post.__table__).where(models.Post.__table__.c.id == bindparam("pid")).values({column: counter + bindparam("delta")})
+    session.execute(stmt, [{"pid": pid, "delta": delta} for pid, delta in deltas.items()])
+
+
+PROFILE_PAGE_SIZE = 20
+
+
+@app.get("/users/{username}", response_model=schemas.ProfileOut, summary="User profile", description="View a user's profile and the first page of their posts in reverse chronological order. Continue with the returned `next_cursor` (here or on `/users/{username}/posts`).")
+@db.reads
+async def profile(request: Request, username: str, cursor: Optional[str] = None, page_size: int = PROFILE_PAGE_SIZE, include_replies: str = INCLUDE_REPLIES):
+    page_size = min(100, max(1, page_size))
+    replies = _reply_mode(include_replies)
+    validator = await db.run(versions.read_profile, username)
+    if validator is None:
+        raise HTTPException(status_code=404, detail="user not found")
+    if versions.not_modified(request, validator):
+        return versions.not_modified_response(validator, READ_CACHE_CONTROL)
+
+    def load(session: Session):
+        user = _get_user_or_404(session, username)
+        posts = _user_posts_page(session, user, cursor, page_size)
+        profile = {
+            "id": user.id,
+            "username": user.username,
+            "display_name": user.display_name,
+            "created_at": user.created_at,
+            "posts": _hydrate_posts(session, posts, replies),
+            "next_cursor": pagination.next_cursor(posts, page_size),
+        }
+        return profile, [f"user:{user.id}"]
+
+    response = _json(await _cached(("profile", username, validator.version, cursor, page_size, replies), load))
+    versions.set_headers(response, validator, READ_CACHE_CONTROL)
+    return response
+
+
+@app.get("/cache/stats", include_in_schema=False)
+def cache_stats():
+    return read_cache.stats()
+
+
+metrics.gauge("vibe_read_cache", "Read cache counters and size.", read_cache.stats, ("stat",))
+metrics.gauge("vibe_live_events", "Live event hub subscribers and totals.", events.hub.stats, ("stat",))
+metrics.gauge("vibe_password_service", "Argon2 worker pool queue state.", passwords.service.stats, ("stat",))
+metrics.gauge("vibe_log_records_dropped", "Log records dropped because the log queue was full.", lambda: logger.DroppingQueueHandler.dropped)
+metrics.gauge("vibe_db_pool_checked_out", "Database connections currently checked out.", lambda: getattr(db._engine.pool, "checkedout", lambda: None)() if db._engine else None)
+
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/users/{username}/posts", response_model=List[schemas.PostOut], summary="User posts", description="List a user's posts newest first without embedded replies (see `reply_count`). Paginate with the opaque `cursor` returned in the `X-Next-Cursor` header.")
+@db.reads
+async def user_posts(username: str, cursor: Optional[str] = None, page_size: int = 50):
+    page_size = min(100, max(1, page_size))
+
+    def load(session: Session):
+        user = _get_user_or_404(session, username)
+        posts = _user_posts_page(session, user, cursor, page_size)
+        return _hydrate_posts(session, posts, replies=0), pagination.next_cursor(posts, page_size)
+
+    out_posts, next_cursor = await db.run(load)
+    return _json(out_posts, next_cursor)
+
+
+@app.get("/posts/{post_id}", response_model=schemas.PostOut, summary="Get a post", description="A single post by id, with its reply count and first replies as selected by `include_replies`.")
+@db.reads
+async def get_post(post_id: int, include_replies: str = INCLUDE_REPLIES):
+    replies = _reply_mode(include_replies)
+
+    def load(session: Session):
+        return _hydrate_posts(session, [_get_post_or_404(session, post_id)], replies)[0]
+
+    return _json(await db.run(load))
+
+
+@app.get("/posts/{post_id}/replies", response_model=List[schemas.PostOut], summary="Post replies", description="Replies to a post, oldest first. Paginate with the opaque `cursor` returned in the `X-Next-Cursor` header.")
+@db.reads
+async def post_replies(post_id: int, cursor: Optional[str] = None, page_size: int = 50):
+    page_size = min(100, max(1, page_size))
+
+    def load(session: Session):
+        parent = _get_post_or_404(session, post_id)
+        model = models.ArchivedPost if archive.is_archived(parent) else models.Post
+        stmt = pagination.oldest_first(select(model).where(model.parent_id == post_id), cursor, model.created_at, model.id)
+        posts = session.exec(stmt.limit(page_size)).all()
+        return _hydrate_posts(session, posts, replies=0), pagination.next_cursor(posts, page_size)
+
+    out_posts, next_cursor = await db.run(load)
+    return _json(out_posts, next_cursor)
+
+
+async def _cached(key: Tuple, load: Callable[[Session], Tuple[Any, List[str]]]) -> Any:
+    """Serve `load` through the read cache, except for clients pinned to the primary: the cached
+    value may have been read from a replica that has not caught up with their write yet."""
+    if db.pinned_to_primary():
+        return (await db.run(load))[0]
+    return await read_cache.aget_or_set(key, lambda: db.run(load))
+
+
+def _json(content: Any, next_cursor: Optional[str] = None) -> ORJSONResponse:
+    """Encode an already response-shaped payload with orjson.
+
+    Returning a Response skips FastAPI's second validation pass against `response_model`;
+    the decorators keep `response_model` only for the OpenAPI schema.
+    """
+    response = ORJSONResponse(content)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response
+
+
+def _record_write(session: Session, *author_ids: Optional[int]) -> List[str]:
+    """Bump the version of the feed and the given authors' profiles in the current transaction.
+
+    Returns the affected tags so the caller can drop them from the read cache after committing.
+    """
+    tags = versions.tags_for(*author_ids)
+    versions.bump(session, tags)
+    return tags
+
+
+def _get_user_or_404(session: Session, username: str) -> models.User:
     statement = select(models.User).where(models.User.username == username)
     user = session.exec(statement).first()
     if not user:
         raise HTTPException(status_code=404, detail="user not found")
-    # user's posts chronological
-    stmt = select(models.Post).where(models.Post.author_id == user.id).order_by(models.Post.created_at.desc())
-    posts = session.exec(stmt).all()
-    out_posts = [_post_out(session, p) for p in posts]
-    profile = schemas.ProfileOut(
-        id=user.id,
-        username=user.username,
-        display_name=user.display_name,
-        created_at=user.created_at,
-        posts=out_posts,
-    )
-    return profile
-
-
-def _post_out(session: Session, post: models.Post) -> schemas.PostOut:
-    # count likes
-    stmt_likes = select(models.Like).where(models.Like.post_id == post.id)
-    likes = session.exec(stmt_likes).all()
-    # author username
-    author = session.get(models.User, post.author_id)
-    author_un = author.username if author else "<deleted>"
-    # gather replies one level
-    stmt_replies = select(models.Post).where(models.Post.parent_id == post.id).order_by(models.Post.created_at.asc())
-    replies = session.exec(stmt_replies).all()
-    out_replies = []
-    for r in replies:
-        stmt_rlikes = select(models.Like).where(models.Like.post_id == r.id)
-        rl = session.exec(stmt_rlikes).all()
-        out_replies.append(schemas.PostOut(
-            id=r.id,
-            author_username=(session.get(models.User, r.author_id).username if session.get(models.User, r.author_id) else "<deleted>"),
-            author_id=r.author_id,
-            content=r.content,
-            created_at=r.created_at,
-            parent_id=r.parent_id,
-            likes=len(rl),
-            replies=[],
-        ))
-    return schemas.PostOut(
-        id=post.id,
-        author_username=author_un,
-        author_id=post.author_id,
-        content=post.content,
-        created_at=post.created_at,
-        parent_id=post.parent_id,
-        likes=len(likes),
-        replies=out_replies,
-    )
+    return user
+
+
+def _user_posts_page(session: Session, user: models.User, cursor: Optional[str], page_size: int) -> List[models.Post]:
+    return archive.newest_first(session, cursor, page_size, where=lambda table: table.c.author_id == user.id)
+
+
+def _load_posts(session: Session, post_ids: Iterable[int]) -> Dict[int, models.Post]:
+    """Posts by id from the hot table. Archived ones are restored first, uncommitted: replying to an old thread revives it."""
+    post_ids = set(post_ids)
+    found = {p.id: p for p in session.exec(select(models.Post).where(models.Post.id.in_(post_ids))).all()}
+    missing = post_ids - set(found)
+    if missing and archive.restore(session, missing):
+        found.update({p.id: p for p in session.exec(select(models.Post).where(models.Post.id.in_(missing))).all()})
+    return found
+
+
+def _post_authors(session: Session, post_ids: Iterable[int]) -> Dict[int, Tuple[int, Optional[int]]]:
+    """`likes.post_authors`, restoring archived posts first (uncommitted) so a like on an old thread lands in the hot tables."""
+    post_ids = set(post_ids)
+    authors = likes.post_authors(session, post_ids)
+    missing = post_ids - set(authors)
+    if missing and archive.restore(session, missing):
+        authors.update(likes.post_authors(session, missing))
+    return authors
+
+
+def _reply_mode(include_replies: str) -> Optional[int]:
+    """`include_replies` as the `replies` argument of `_hydrate_posts`."""
+    if include_replies == "none":
+        return None
+    if include_replies == "count":
+        return 0
+    return min(MAX_REPLY_PREVIEW, int(include_replies.split(":", 1)[1]))
+
+
+def _get_post_or_404(session: Session, post_id: int):
+    """A post from the hot table or, failing that, the archive."""
+    post = session.get(models.Post, post_id) or session.get(models.ArchivedPost, post_id)
+    if post is None:
+        raise HTTPException(status_code=404, detail="post not found")
+    return post
+
+
+def _reply_previews(session: Session, posts: Sequence[models.Post], limit: int) -> list:
+    """The first `limit` replies of each post that has any, oldest first, in one statement.
+
+    One bounded range scan per parent on its (parent_id, created_at, id) index, so a thread with
+    thousands of replies costs the same as one with `limit`.
+    """
+    scans = []
+    for p in posts:
+        if not p.reply_count:
+            continue
+        model = models.ArchivedPost if archive.is_archived(p) else models.Post
+        stmt = select(*model.__table__.c).where(model.parent_id == p.id).order_by(model.created_at, model.id).limit(limit)
+        scans.append(select(stmt.subquery()))
+    if not scans:
+        return []
+    # each scan is ordered, the compound as a whole is not
+    return sorted(session.execute(union_all(*scans)).all(), key=lambda r: (r.created_at, r.id))
+
+
+def _hydrate_posts(session: Session, posts: Sequence[models.Post], replies: Optional[int] = REPLY_PREVIEW) -> List[Dict[str, Any]]:
+    """Build `schemas.PostOut`-shaped dicts for `posts` in a fixed number of queries.
+
+    `replies` is None to leave out `reply_count` and `replies`, 0 for `reply_count` only, or N to
+    also embed each post's first N replies. Like/reply counts come from the denormalized Post
+    counters and authors are fetched with `IN`, so the number of statements and the payload
+    size depend only on the number of posts.
+    """
+    if not posts:
+        return []
+    # one level of replies; an archived post's replies were archived with it
+    preview = _reply_previews(session, posts, replies) if replies else []
+    # author usernames
+    author_ids = {p.author_id for p in posts} | {r.author_id for r in preview}
+    stmt_authors = select(models.User.id, models.User.username).where(models.User.id.in_(author_ids))
+    usernames = dict(session.exec(stmt_authors).all())
+
+    def build(p: models.Post, children: List[Dict[str, Any]]) -> Dict[str, Any]:
+        out = {
+            "id": p.id,
+            "author_username": usernames.get(p.author_id, "<deleted>"),
+            "author_id": p.author_id,
+            "content": p.content,
+            "created_at": p.created_at,
+            "parent_id": p.parent_id,
+            "likes": p.like_count,
+        }
+        if replies is not None:
+            out["reply_count"] = p.reply_count
+            out["replies"] = children
+        return out
+
+    replies_by_parent: Dict[int, List[Dict[str, Any]]] = {}
+    for r in preview:
+        replies_by_parent.setdefault(r.parent_id, []).append(build(r, []))
+    return [build(p, replies_by_parent.get(p.id, [])) for p in posts]
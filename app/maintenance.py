@@ -0,0 +1,74 @@
+"""Schema upgrades and repair jobs that operate on an existing database."""
+from sqlalchemy import delete, func, inspect, select, text, update
+from sqlmodel import Session, SQLModel
+from app import models, search
+
+
+# columns added after the first release; create_all() does not add them to existing tables
+_ADDED_COLUMNS = {
+    "user": {
+        "follower_count": "INTEGER NOT NULL DEFAULT 0",
+    },
+    "post": {
+        "like_count": "INTEGER NOT NULL DEFAULT 0",
+        "reply_count": "INTEGER NOT NULL DEFAULT 0",
+    },
+}
+
+# indexes made redundant by a wider one with the same leading column; they only slow down writes
+_DROPPED_INDEXES = ("ix_post_parent_id", "ix_post_author_id", "ix_post_created_at")
+
+
+def upgrade_schema(engine) -> bool:
+    """Add missing columns, indexes and the search index to existing databases. Returns True if counters had to be recomputed (a column was added or duplicate likes removed)."""
+    inspector = inspect(engine)
+    added = False
+    with engine.begin() as conn:
+        for table, columns in _ADDED_COLUMNS.items():
+            existing = {c["name"] for c in inspector.get_columns(table)}
+            for name, ddl in columns.items():
+                if name not in existing:
+                    conn.execute(text(f'ALTER TABLE "{table}" ADD COLUMN {name} {ddl}'))
+                    added = True
+        # the unique like index cannot be built while duplicates from the old check-then-insert path exist
+        if "uq_like_user_id_post_id" not in {i["name"] for i in inspector.get_indexes("like")}:
+            if dedupe_likes(conn):
+                added = True
+        # create_all() only creates indexes together with new tables
+        for table in SQLModel.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+        for name in _DROPPED_INDEXES:
+            conn.execute(text(f'DROP INDEX IF EXISTS "{name}"'))
+    if added:
+        with Session(engine) as session:
+            backfill_post_counters(session)
+    search.ensure_index(engine)
+    return added
+
+
+def dedupe_likes(conn) -> int:
+    """Delete all but the oldest like of each (user, post) pair. Returns the number of rows removed."""
+    like = models.Like.__table__
+    keep = select(func.min(like.c.id)).group_by(like.c.user_id, like.c.post_id)
+    return conn.execute(delete(like).where(like.c.id.not_in(keep))).rowcount
+
+
+def backfill_post_counters(session: Session) -> int:
+    """Recompute Post.like_count / Post.reply_count from the Like and Post tables.
+
+    Only rows whose stored counters disagree are rewritten. Returns the number of repaired posts.
+    """
+    post = models.Post.__table__
+    like = models.Like.__table__
+    reply = post.alias("reply")
+    likes = select(func.count(like.c.id)).where(like.c.post_id == post.c.id).scalar_subquery()
+    replies = select(func.count(reply.c.id)).where(reply.c.parent_id == post.c.id).scalar_subquery()
+    stmt = (
+        update(post)
+        .where((post.c.like_count != likes) | (post.c.reply_count != replies))
+        .values(like_count=likes, reply_count=replies)
+    )
+    result = session.execute(stmt)
+    session.commit()
+    return result.rowcount
@@ -0,0 +1,275 @@
+"""Request, SQL, pool, hashing and rate-limit metrics in Prometheus text format, plus a slow-request log."""
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# requests slower than this are logged with their SQL statements; 0 disables the log
+SLOW_REQUEST_MS = float(os.environ.get("VIBE_SLOW_REQUEST_MS", "0"))
+SLOW_REQUEST_MAX_STATEMENTS = int(os.environ.get("VIBE_SLOW_REQUEST_MAX_STATEMENTS", "50"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 4, 5, 8, 13, 21, 34, 55, 89)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", *self._samples()]
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, k)} {v}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+        # label values -> [count per bucket..., +Inf count, sum]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    row[i] += 1
+                    break
+            else:
+                row[len(self.buckets)] += 1
+            row[-1] += value
+
+    def count(self, **labels: str) -> int:
+        row = self._values.get(self._key(labels))
+        return int(sum(row[:-1])) if row else 0
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        lines = []
+        for key, row in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), row[:-1]):
+                cumulative += n
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{float(bound)!r}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {row[-1]}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Gauge(_Metric):
+    """A value read from `fn` at scrape time; `fn` returns a number or a {label value: number} dict."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, fn: Callable, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self.fn = fn
+
+    def _samples(self) -> List[str]:
+        value = self.fn()
+        if isinstance(value, dict):
+            return [f"{self.name}{_labels(self.labelnames, (k,))} {v}" for k, v in sorted(value.items())]
+        return [] if value is None else [f"{self.name} {value}"]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        # re-registering (e.g. when app.main is reloaded) replaces the previous metric of that name
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def render() -> str:
+    return registry.render()
+
+
+def gauge(name: str, help: str, fn: Callable, labelnames: Iterable[str] = ()) -> Gauge:
+    """Register a gauge computed by `fn` at scrape time."""
+    return registry.register(Gauge(name, help, fn, tuple(labelnames)))
+
+
+HTTP_REQUESTS = registry.register(Counter("vibe_http_requests_total", "HTTP requests by route and status.", ("method", "route", "status")))
+HTTP_DURATION = registry.register(Histogram("vibe_http_request_duration_seconds", "HTTP request latency.", ("method", "route")))
+SQL_STATEMENTS = registry.register(Counter("vibe_sql_statements_total", "SQL statements executed, by route ('' outside requests).", ("route",)))
+SQL_PER_REQUEST = registry.register(Histogram("vibe_sql_statements_per_request", "SQL statements per request.", ("route",), COUNT_BUCKETS))
+SQL_DURATION = registry.register(Histogram("vibe_sql_request_duration_seconds", "Time spent in SQL per request.", ("route",)))
+POOL_WAIT = registry.register(Histogram("vibe_db_pool_checkout_wait_seconds", "Time waiting for a database connection from the pool.", (), (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)))
+PASSWORD_DURATION = registry.register(Histogram("vibe_password_hash_seconds", "Argon2 hash/verify time, excluding queueing.", ("op",)))
+PASSWORD_QUEUE = registry.register(Histogram("vibe_password_queue_wait_seconds", "Time Argon2 jobs waited for a free slot.", ("op",)))
+RATE_LIMITED = registry.register(Counter("vibe_rate_limit_rejections_total", "Requests rejected by the rate limiter.", ("scope",)))
+SLOW_REQUESTS = registry.register(Counter("vibe_slow_requests_total", "Requests slower than VIBE_SLOW_REQUEST_MS.", ("route",)))
+
+
+class RequestStats:
+    """Per-request accumulator the SQL hooks write into (shared with threadpool workers through the context)."""
+
+    __slots__ = ("statements", "sql_seconds", "log")
+
+    def __init__(self, keep_statements: bool):
+        self.statements = 0
+        self.sql_seconds = 0.0
+        # (statement, seconds) pairs, only kept when the slow-request log is on
+        self.log: Optional[List[Tuple[str, float]]] = [] if keep_statements else None
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("vibe_request_stats", default=None)
+
+
+def current() -> Optional[RequestStats]:
+    return _current.get()
+
+
+def instrument_engine(engine) -> None:
+    """Count and time every statement executed on a (sync) engine."""
+    from sqlalchemy import event
+
+    # the start time lives on the per-statement execution context, so a statement that fails
+    # (and never reaches after_cursor_execute) leaves nothing behind on the pooled connection
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._vibe_query_start = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_vibe_query_start", None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        stats = _current.get()
+        if stats is None:
+            SQL_STATEMENTS.inc(route="")
+            return
+        stats.statements += 1
+        stats.sql_seconds += elapsed
+        if stats.log is not None and len(stats.log) < SLOW_REQUEST_MAX_STATEMENTS:
+            stats.log.append((statement, elapsed))
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing each request and attributing its SQL statements to the matched route template."""
+
+    def __init__(self, app, slow_request_ms: float = SLOW_REQUEST_MS):
+        self.app = app
+        self.slow_request_ms = slow_request_ms
+        self._templates: Optional[Dict[Callable, str]] = None
+        self._log = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = RequestStats(keep_statements=self.slow_request_ms > 0)
+        token = _current.set(stats)
+        status = 500
+        streaming = False
+        started = time.perf_counter()
+
+        async def wrapped_send(message):
+            nonlocal status, streaming
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                streaming = any(k == b"content-type" and v.startswith(b"text/event-stream") for k, v in message.get("headers", []))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, wrapped_send)
+        finally:
+            _current.reset(token)
+            self._record(scope, status, streaming, time.perf_counter() - started, stats)
+
+    def _route(self, scope) -> str:
+        if self._templates is None and "app" in scope:
+            self._templates = {r.endpoint: r.path for r in scope["app"].routes if hasattr(r, "endpoint")}
+        template = (self._templates or {}).get(scope.get("endpoint"))
+        # mounts (static files) only set root_path; anything else did not match a route
+        return template or scope.get("root_path") or "<unmatched>"
+
+    def _record(self, scope, status: int, streaming: bool, elapsed: float, stats: RequestStats) -> None:
+        route, method = self._route(scope), scope.get("method", "")
+        HTTP_REQUESTS.inc(method=method, route=route, status=str(status))
+        # a server-sent event stream lasts as long as the client stays; its duration is not a latency
+        if streaming:
+            return
+        HTTP_DURATION.observe(elapsed, method=method, route=route)
+        SQL_STATEMENTS.inc(stats.statements, route=route)
+        SQL_PER_REQUEST.observe(stats.statements, route=route)
+        SQL_DURATION.observe(stats.sql_seconds, route=route)
+        if self.slow_request_ms > 0 and elapsed * 1000 >= self.slow_request_ms:
+            SLOW_REQUESTS.inc(route=route)
+            if self._log is None:
+                from app import logger
+                self._log = logger.get_logger()
+            self._log.warning("slow_request", extra={
+                "method": method,
+                "route": route,
+                "path": scope.get("path"),
+                "status": status,
+                "duration_ms": round(elapsed * 1000, 1),
+                "sql_count": stats.statements,
+                "sql_ms": round(stats.sql_seconds * 1000, 1),
+                "statements": [f"{seconds * 1000:.1f}ms {statement}" for statement, seconds in stats.log or []],
+            })
+
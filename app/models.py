@@ -1,5 +1,6 @@
-from typing import Optional
+from typing import ClassVar, Optional
 from datetime import datetime, timezone
+from sqlalchemy import Index, UniqueConstraint
 from sqlmodel import SQLModel, Field, Relationship
 
 
@@ -9,23 +10,40 @@ class User(SQLModel, table=True):
     display_name: Optional[str]
     hashed_password: str
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    # denormalized, maintained by follow/unfollow; decides fan-out-on-write vs pull-on-read
+    follower_count: int = Field(default=0)
 
     posts: list["Post"] = Relationship(back_populates="author")
     likes: list["Like"] = Relationship(back_populates="user")
 
 
 class Post(SQLModel, table=True):
+    # keyset pagination walks (created_at, id) newest first, globally and per author
+    __table_args__ = (
+        Index("ix_post_created_at_id", "created_at", "id"),
+        Index("ix_post_author_id_created_at_id", "author_id", "created_at", "id"),
+        # a thread's replies, oldest first: reply previews and /posts/{id}/replies
+        Index("ix_post_parent_id_created_at_id", "parent_id", "created_at", "id"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
-    author_id: int = Field(foreign_key="user.id", index=True)
+    # author_id and created_at are covered by the composite indexes above, which lead with them
+    author_id: int = Field(foreign_key="user.id")
     content: str = Field(max_length=280)
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), index=True)
-    parent_id: Optional[int] = Field(default=None, foreign_key="post.id", index=True)
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    parent_id: Optional[int] = Field(default=None, foreign_key="post.id")
+    # denormalized counters, maintained by the write paths (see maintenance.backfill_post_counters)
+    like_count: int = Field(default=0)
+    reply_count: int = Field(default=0)
 
     author: Optional[User] = Relationship(back_populates="posts")
     likes: list["Like"] = Relationship(back_populates="post")
 
 
 class Like(SQLModel, table=True):
+    # one like per user and post; the write path inserts with ON CONFLICT DO NOTHING against it
+    __table_args__ = (Index("uq_like_user_id_post_id", "user_id", "post_id", unique=True),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="user.id", index=True)
     post_id: int = Field(foreign_key="post.id", index=True)
@@ -33,3 +51,66 @@ class Like(SQLModel, table=True):
 
     user: Optional[User] = Relationship(back_populates="likes")
     post: Optional[Post] = Relationship(back_populates="likes")
+
+
+class ArchivedPost(SQLModel, table=True):
+    """A post moved out of `post` by the archival job (app/archive.py); same columns, same id."""
+
+    __tablename__ = "post_archive"
+    __table_args__ = (
+        Index("ix_post_archive_created_at_id", "created_at", "id"),
+        Index("ix_post_archive_author_id_created_at_id", "author_id", "created_at", "id"),
+        Index("ix_post_archive_parent_id_created_at_id", "parent_id", "created_at", "id"),
+    )
+    archived: ClassVar[bool] = True
+
+    id: int = Field(primary_key=True, sa_column_kwargs={"autoincrement": False})
+    author_id: int
+    content: str
+    created_at: datetime
+    parent_id: Optional[int] = None
+    like_count: int = Field(default=0)
+    reply_count: int = Field(default=0)
+
+
+class ArchivedLike(SQLModel, table=True):
+    """A like of an archived post; moves together with the post."""
+
+    __tablename__ = "like_archive"
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int
+    post_id: int = Field(index=True)
+    created_at: datetime
+
+
+class Follow(SQLModel, table=True):
+    __table_args__ = (UniqueConstraint("follower_id", "followee_id", name="uq_follow_follower_followee"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    follower_id: int = Field(foreign_key="user.id")
+    # fan-out looks up all followers of an author
+    followee_id: int = Field(foreign_key="user.id", index=True)
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+class TimelineEntry(SQLModel, table=True):
+    """A post pushed into a follower's home timeline at write time."""
+
+    # a timeline page is one range scan over (user_id, created_at, post_id)
+    __table_args__ = (Index("ix_timelineentry_user_id_created_at_post_id", "user_id", "created_at", "post_id"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="user.id")
+    post_id: int = Field(foreign_key="post.id")
+    author_id: int = Field(foreign_key="user.id")
+    # copy of the post's created_at so the timeline can be paged without joining post
+    created_at: datetime
+
+
+class ContentVersion(SQLModel, table=True):
+    """Change counter per cached/validated view ("feed", "user:<id>"), bumped by the write paths."""
+
+    name: str = Field(primary_key=True)
+    version: int = Field(default=0)
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
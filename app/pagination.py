@@ -0,0 +1,61 @@
+"""Opaque keyset cursors over `(created_at, id)` for post listings."""
+import base64
+from datetime import datetime
+from typing import Optional, Sequence, Tuple
+from fastapi import HTTPException
+from sqlalchemy import and_, or_
+from app import models
+
+
+def encode_cursor(post: models.Post) -> str:
+    return encode_key(post.created_at, post.id)
+
+
+def encode_key(created_at: datetime, post_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{post_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, post_id = base64.urlsafe_b64decode(padded.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(post_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="invalid cursor")
+
+
+def newest_first(statement, cursor: Optional[str] = None, created_col=None, id_col=None):
+    """Order `statement` newest first and, if given, start strictly after `cursor`.
+
+    The key columns default to Post.created_at / Post.id; pass others for tables that copy them.
+    """
+    created_col = models.Post.created_at if created_col is None else created_col
+    id_col = models.Post.id if id_col is None else id_col
+    statement = statement.order_by(created_col.desc(), id_col.desc())
+    if cursor:
+        created_at, post_id = decode_cursor(cursor)
+        statement = statement.where(or_(
+            created_col < created_at,
+            and_(created_col == created_at, id_col < post_id),
+        ))
+    return statement
+
+
+def oldest_first(statement, cursor: Optional[str], created_col, id_col):
+    """Like `newest_first`, in ascending order: the page after `cursor` holds newer rows."""
+    statement = statement.order_by(created_col.asc(), id_col.asc())
+    if cursor:
+        created_at, post_id = decode_cursor(cursor)
+        statement = statement.where(or_(
+            created_col > created_at,
+            and_(created_col == created_at, id_col > post_id),
+        ))
+    return statement
+
+
+def next_cursor(posts: Sequence[models.Post], page_size: int) -> Optional[str]:
+    """Cursor for the page after `posts`, or None when this was the last page."""
+    if len(posts) < page_size:
+        return None
+    return encode_cursor(posts[-1])
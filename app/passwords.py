@@ -0,0 +1,129 @@
+"""Argon2 hashing off the request path: a bounded process pool with a concurrency cap and queue metrics."""
+import asyncio
+import atexit
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
+from starlette.concurrency import run_in_threadpool
+from app import metrics
+
+
+def argon2_params() -> Tuple[int, int, int]:
+    """(time_cost, memory_cost KiB, parallelism) from VIBE_ARGON2_*; defaults match argon2-cffi's."""
+    return (
+        int(os.environ.get("VIBE_ARGON2_TIME_COST", "3")),
+        int(os.environ.get("VIBE_ARGON2_MEMORY_COST", "65536")),
+        int(os.environ.get("VIBE_ARGON2_PARALLELISM", "4")),
+    )
+
+
+@lru_cache(maxsize=None)
+def hasher(params: Tuple[int, int, int]) -> PasswordHasher:
+    time_cost, memory_cost, parallelism = params
+    return PasswordHasher(time_cost=time_cost, memory_cost=memory_cost, parallelism=parallelism)
+
+
+# module-level so they can be pickled into pool workers
+
+def hash_password(password: str, params: Tuple[int, int, int]) -> str:
+    return hasher(params).hash(password)
+
+
+def verify_and_rehash(hashed: str, password: str, params: Tuple[int, int, int]) -> Tuple[bool, Optional[str]]:
+    """Verify `password`; if it matches but `hashed` uses outdated parameters, also return a fresh hash."""
+    ph = hasher(params)
+    try:
+        ph.verify(hashed, password)
+    except (VerificationError, InvalidHashError):
+        return False, None
+    return True, (ph.hash(password) if ph.check_needs_rehash(hashed) else None)
+
+
+class PasswordService:
+    """Runs Argon2 in a process pool, at most `max_concurrency` jobs at a time.
+
+    With `workers=0` jobs run on the threadpool instead (handy for tests and tiny deployments).
+    """
+
+    def __init__(self, workers: int, max_concurrency: int, params: Tuple[int, int, int]):
+        self.workers = workers
+        self.max_concurrency = max_concurrency
+        self.params = params
+        self._executor: Optional[Executor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.queued = 0
+        self.active = 0
+        self.completed = 0
+        self.queue_seconds_total = 0.0
+        self.queue_seconds_max = 0.0
+
+    @classmethod
+    def from_env(cls) -> "PasswordService":
+        workers = int(os.environ.get("VIBE_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+        max_concurrency = int(os.environ.get("VIBE_HASH_MAX_CONCURRENCY", str(max(1, workers) * 2)))
+        return cls(workers, max_concurrency, argon2_params())
+
+    async def hash(self, password: str) -> str:
+        return await self._submit(hash_password, password, self.params)
+
+    async def verify(self, hashed: str, password: str) -> Tuple[bool, Optional[str]]:
+        """Returns (matches, new_hash); new_hash is set when the stored hash should be upgraded."""
+        return await self._submit(verify_and_rehash, hashed, password, self.params)
+
+    async def _submit(self, fn, *args):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        queued_at = time.perf_counter()
+        self.queued += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.queued -= 1
+        waited = time.perf_counter() - queued_at
+        self.queue_seconds_total += waited
+        self.queue_seconds_max = max(self.queue_seconds_max, waited)
+        metrics.PASSWORD_QUEUE.observe(waited, op=fn.__name__)
+        self.active += 1
+        started = time.perf_counter()
+        try:
+            if self.workers <= 0:
+                return await run_in_threadpool(fn, *args)
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=_mp_context())
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            metrics.PASSWORD_DURATION.observe(time.perf_counter() - started, op=fn.__name__)
+            self.active -= 1
+            self.completed += 1
+            self._semaphore.release()
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "workers": self.workers,
+            "max_concurrency": self.max_concurrency,
+            "queued": self.queued,
+            "active": self.active,
+            "completed": self.completed,
+            "queue_seconds_total": self.queue_seconds_total,
+            "queue_seconds_max": self.queue_seconds_max,
+        }
+
+
+def _mp_context():
+    """Never fork: by the time the pool starts, the server runs threads (log writer, threadpool, like
+    flusher) whose locks a forked child would inherit mid-use. forkserver forks from a clean helper."""
+    return multiprocessing.get_context("forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+
+
+service = PasswordService.from_env()
+atexit.register(service.shutdown)
@@ -1,37 +1,246 @@
 from fastapi import Request, HTTPException, Depends
-from typing import Callable
+from typing import Callable, Dict, List, Optional, Tuple
+import abc
+import math
+import os
+import sqlite3
 import time
 import threading
-from app import auth
+from app import auth, metrics
 
-_lock = threading.Lock()
-_store: dict[str, list[float]] = {}
+# (window_start, count in current window, count in previous window)
+_Window = Tuple[float, int, int]
+
+
+def _current(entry: Optional[_Window], now: float, window: float) -> _Window:
+    """`entry` rolled forward to the fixed window containing `now`."""
+    start = now - (now % window)
+    if entry is None or entry[0] < start - window:
+        return start, 0, 0
+    if entry[0] < start:
+        return start, 0, entry[1]
+    return start, entry[1], entry[2]
+
+
+def _slide(entry: Optional[_Window], now: float, window: float, limit: int, cost: int = 1) -> Tuple[bool, _Window]:
+    """Sliding-window counter: weight the previous fixed window by how much of it still overlaps.
+
+    Keeps two integers per key instead of one timestamp per request.
+    """
+    start, curr, prev = _current(entry, now, window)
+    estimated = prev * (1 - (now - start) / window) + curr
+    if estimated + cost > limit:
+        return False, (start, curr, prev)
+    return True, (start, curr + cost, prev)
+
+
+def _wait(entry: Optional[_Window], now: float, window: float, limit: int, cost: int = 1) -> float:
+    """Seconds from `now` until the sliding estimate leaves room for `cost` more hits."""
+    start, curr, prev = _current(entry, now, window)
+    room = limit - cost
+    if room < 0:
+        # never fits; a full window is as good an answer as any
+        return window
+    if curr <= room:
+        # fits later in this window, once enough of the previous one has slid out
+        at = start + window * (1 - (room - curr) / prev) if prev else now
+    else:
+        # fits in the next window, once enough of this one has slid out
+        at = start + window * (2 - room / curr)
+    return max(0.0, at - now)
+
+
+class RateLimitBackend(abc.ABC):
+    """Counts hits per key; `hit` returns False (and counts nothing) when `cost` more would exceed the limit."""
+
+    @abc.abstractmethod
+    def hit(self, key: str, limit: int, window: float, cost: int = 1) -> bool:
+        ...
+
+    @abc.abstractmethod
+    def retry_after(self, key: str, limit: int, window: float, cost: int = 1) -> float:
+        """Seconds until `cost` more hits on `key` would be allowed."""
+
+    @abc.abstractmethod
+    def reset(self) -> None:
+        ...
+
+
+class MemoryBackend(RateLimitBackend):
+    """Per-process sliding-window counters with a background sweeper for idle keys."""
+
+    def __init__(self, sweep_interval: float = 60.0):
+        self.sweep_interval = sweep_interval
+        self._lock = threading.Lock()
+        # key -> [window_start, curr, prev, window]
+        self._store: Dict[str, List[float]] = {}
+        self._sweeper: Optional[threading.Thread] = None
+
+    def hit(self, key: str, limit: int, window: float, cost: int = 1) -> bool:
+        self._start_sweeper()
+        now = time.time()
+        with self._lock:
+            entry = self._store.get(key)
+            allowed, (start, curr, prev) = _slide(tuple(entry[:3]) if entry else None, now, window, limit, cost)
+            self._store[key] = [start, curr, prev, window]
+        return allowed
+
+    def retry_after(self, key: str, limit: int, window: float, cost: int = 1) -> float:
+        with self._lock:
+            entry = self._store.get(key)
+        return _wait(tuple(entry[:3]) if entry else None, time.time(), window, limit, cost)
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Drop keys whose counters no longer affect any decision. Returns the number removed."""
+        now = time.time() if now is None else now
+        with self._lock:
+            idle = [k for k, (start, _, _, window) in self._store.items() if start + 2 * window <= now]
+            for k in idle:
+                del self._store[k]
+        return len(idle)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._store.clear()
+
+    def __len__(self) -> int:
+        return len(self._store)
+
+    def _start_sweeper(self) -> None:
+        if self._sweeper is not None or self.sweep_interval <= 0:
+            return
+        with self._lock:
+            if self._sweeper is None:
+                self._sweeper = threading.Thread(target=self._sweep_forever, name="ratelimit-sweeper", daemon=True)
+                self._sweeper.start()
+
+    def _sweep_forever(self) -> None:
+        while True:
+            time.sleep(self.sweep_interval)
+            self.sweep()
+
+
+class SQLiteBackend(RateLimitBackend):
+    """Sliding-window counters in a small SQLite file shared by every worker process on the host."""
+
+    def __init__(self, path: str, sweep_interval: float = 60.0):
+        self.path = path
+        self.sweep_interval = sweep_interval
+        self._local = threading.local()
+        self._last_sweep = 0.0
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limit ("
+                "key TEXT PRIMARY KEY, window_start REAL NOT NULL, curr INTEGER NOT NULL, "
+                "prev INTEGER NOT NULL, window REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def hit(self, key: str, limit: int, window: float, cost: int = 1) -> bool:
+        now = time.time()
+        conn = self._connect()
+        # IMMEDIATE takes the write lock up front so read-modify-write is atomic across processes
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT window_start, curr, prev FROM rate_limit WHERE key = ?", (key,)).fetchone()
+            allowed, (start, curr, prev) = _slide(row, now, window, limit, cost)
+            conn.execute(
+                "INSERT INTO rate_limit (key, window_start, curr, prev, window) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET window_start = excluded.window_start, curr = excluded.curr, "
+                "prev = excluded.prev, window = excluded.window",
+                (key, start, curr, prev, window),
+            )
+            if now - self._last_sweep >= self.sweep_interval:
+                self._last_sweep = now
+                conn.execute("DELETE FROM rate_limit WHERE window_start + 2 * window <= ?", (now,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return allowed
+
+    def retry_after(self, key: str, limit: int, window: float, cost: int = 1) -> float:
+        row = self._connect().execute("SELECT window_start, curr, prev FROM rate_limit WHERE key = ?", (key,)).fetchone()
+        return _wait(row, time.time(), window, limit, cost)
+
+    def reset(self) -> None:
+        self._connect().execute("DELETE FROM rate_limit")
+
+
+def _backend_from_env() -> RateLimitBackend:
+    kind = os.environ.get("VIBE_RL_BACKEND", "memory")
+    sweep = float(os.environ.get("VIBE_RL_SWEEP_INTERVAL", "60"))
+    if kind == "memory":
+        return MemoryBackend(sweep_interval=sweep)
+    if kind == "sqlite":
+        return SQLiteBackend(os.environ.get("VIBE_RL_SQLITE_PATH", "./ratelimit.db"), sweep_interval=sweep)
+    raise ValueError(f"unknown VIBE_RL_BACKEND: {kind!r}")
+
+
+_backend: Optional[RateLimitBackend] = None
+_backend_lock = threading.Lock()
+
+
+def get_backend() -> RateLimitBackend:
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = _backend_from_env()
+    return _backend
+
+
+def set_backend(backend: Optional[RateLimitBackend]) -> None:
+    """Replace the process-wide backend; None re-reads the configuration on next use."""
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+
+def _client_key(request: Request, current_user) -> str:
+    if current_user is not None:
+        return f"user:{current_user.username}"
+    # fallback to IP-based key
+    client = request.client.host if request.client else "anon"
+    return f"ip:{client}"
+
+
+def charge(key: str, max_requests: int, window_seconds: int, cost: int = 1, scope: str = "") -> None:
+    """Count `cost` units against `key`; raise 429 if that would exceed `max_requests` per window."""
+    backend, key = get_backend(), f"{key}:{scope}{window_seconds}"
+    if not backend.hit(key, max_requests, window_seconds, cost):
+        metrics.RATE_LIMITED.inc(scope=scope.rstrip(":") or "default")
+        retry_after = max(1, math.ceil(backend.retry_after(key, max_requests, window_seconds, cost)))
+        raise HTTPException(status_code=429, detail="rate limit exceeded", headers={"Retry-After": str(retry_after)})
 
 
 def rate_limit(max_requests: int = 3, window_seconds: int = 60) -> Callable:
     def dependency(request: Request, current_user=Depends(auth.get_current_user)):
         # current_user will be resolved by FastAPI when this dependency is used
-        if current_user is not None:
-            key = f"user:{current_user.username}"
-        else:
-            # fallback to IP-based key
-            client = request.client.host if request.client else "anon"
-            key = f"ip:{client}"
+        charge(_client_key(request, current_user), max_requests, window_seconds)
 
-        now = time.time()
-        with _lock:
-            times = _store.get(key, [])
-            # drop old timestamps
-            cutoff = now - window_seconds
-            times = [t for t in times if t > cutoff]
-            if len(times) >= max_requests:
-                raise HTTPException(status_code=429, detail="rate limit exceeded")
-            times.append(now)
-            _store[key] = times
+    return dependency
+
+
+def batch_rate_limit(max_items: int, window_seconds: int = 60) -> Callable:
+    """Like `rate_limit`, but returns a callable the handler uses to charge per item once it knows the batch size.
+
+    Batches draw from their own per-item budget so a bulk import does not exhaust the interactive one.
+    """
+    def dependency(request: Request, current_user=Depends(auth.get_current_user)) -> Callable[[int], None]:
+        key = _client_key(request, current_user)
+        return lambda items: charge(key, max_items, window_seconds, cost=items, scope="batch:")
 
     return dependency
 
 
 def _clear_store_for_tests():
-    with _lock:
-        _store.clear()
+    get_backend().reset()
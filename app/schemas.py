@@ -1,5 +1,5 @@
 from typing import Optional, List
-from pydantic import BaseModel, constr
+from pydantic import BaseModel, conlist, constr
 from datetime import datetime
 
 
@@ -19,6 +19,17 @@ class PostCreate(BaseModel):
     parent_id: Optional[int] = None
 
 
+MAX_BATCH_ITEMS = 100
+
+
+class PostBatchCreate(BaseModel):
+    posts: conlist(PostCreate, min_items=1, max_items=MAX_BATCH_ITEMS)
+
+
+class LikeBatchCreate(BaseModel):
+    post_ids: conlist(int, min_items=1, max_items=MAX_BATCH_ITEMS)
+
+
 class PostOut(BaseModel):
     id: int
     author_username: str
@@ -27,6 +38,7 @@ class PostOut(BaseModel):
     created_at: datetime
     parent_id: Optional[int]
     likes: int
+    reply_count: int = 0
     replies: List["PostOut"] = []
 
     class Config:
@@ -39,6 +51,20 @@ class ProfileOut(BaseModel):
     display_name: Optional[str]
     created_at: datetime
     posts: List[PostOut] = []
+    next_cursor: Optional[str] = None
 
     class Config:
         orm_mode = True
+
+
+class PostBatchItem(BaseModel):
+    index: int
+    ok: bool
+    post: Optional[PostOut] = None
+    error: Optional[str] = None
+
+
+class LikeBatchItem(BaseModel):
+    post_id: int
+    ok: bool
+    error: Optional[str] = None
@@ -0,0 +1,91 @@
+"""Full-text search over post content with an SQLite FTS5 index kept in sync by triggers."""
+import base64
+from typing import List, Optional, Tuple
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlmodel import Session, select
+from app import models
+
+# external-content table: the text lives in `post`, FTS5 only stores the index
+_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS post_fts USING fts5(content, content='post', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS post_fts_ai AFTER INSERT ON post BEGIN "
+    "INSERT INTO post_fts(rowid, content) VALUES (new.id, new.content); END",
+    "CREATE TRIGGER IF NOT EXISTS post_fts_ad AFTER DELETE ON post BEGIN "
+    "INSERT INTO post_fts(post_fts, rowid, content) VALUES ('delete', old.id, old.content); END",
+    "CREATE TRIGGER IF NOT EXISTS post_fts_au AFTER UPDATE OF content ON post BEGIN "
+    "INSERT INTO post_fts(post_fts, rowid, content) VALUES ('delete', old.id, old.content); "
+    "INSERT INTO post_fts(rowid, content) VALUES (new.id, new.content); END",
+]
+
+
+def supported(session_or_engine) -> bool:
+    bind = session_or_engine.get_bind() if isinstance(session_or_engine, Session) else session_or_engine
+    return bind.dialect.name == "sqlite"
+
+
+def ensure_index(engine) -> bool:
+    """Create the FTS table and triggers if missing; index existing posts the first time. Returns True if created."""
+    if not supported(engine):
+        return False
+    with engine.begin() as conn:
+        exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'post_fts'")).first() is not None
+        for statement in _DDL:
+            conn.execute(text(statement))
+        if not exists:
+            conn.execute(text("INSERT INTO post_fts(post_fts) VALUES ('rebuild')"))
+    return not exists
+
+
+def rebuild(session: Session) -> None:
+    """Re-index every post from the `post` table."""
+    session.execute(text("INSERT INTO post_fts(post_fts) VALUES ('rebuild')"))
+    session.commit()
+
+
+def to_match(q: str) -> str:
+    """Turn free text into a safe FTS5 query: every word must match, a trailing `*` makes it a prefix."""
+    terms = []
+    for word in q.split():
+        prefix = word.endswith("*")
+        word = word.rstrip("*").replace('"', '""')
+        if word:
+            terms.append(f'"{word}"' + ("*" if prefix else ""))
+    if not terms:
+        raise HTTPException(status_code=400, detail="empty search query")
+    return " ".join(terms)
+
+
+def _encode_cursor(offset: int, horizon: int) -> str:
+    return base64.urlsafe_b64encode(f"{offset}|{horizon}".encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Tuple[int, int]:
+    try:
+        offset, horizon = base64.urlsafe_b64decode((cursor + "=" * (-len(cursor) % 4)).encode()).decode().split("|")
+        return int(offset), int(horizon)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="invalid cursor")
+
+
+def query(session: Session, q: str, cursor: Optional[str], page_size: int) -> Tuple[List[models.Post], Optional[str]]:
+    """Best matches first (bm25), paginated by position among the posts that existed at the first page.
+
+    bm25 scores depend on corpus-wide statistics, so every new post shifts the rank of every
+    match and a keyset on the rank value would skip or repeat rows. The relative order of the
+    older matches only changes when their scores cross, so the cursor carries the position and
+    the newest post id seen by the first page instead. FTS5 scores every match to sort them
+    anyway, so the offset costs no extra index work.
+    """
+    params = {"match": to_match(q), "limit": page_size, "offset": 0}
+    if cursor:
+        params["offset"], params["horizon"] = _decode_cursor(cursor)
+    else:
+        params["horizon"] = session.execute(text("SELECT coalesce(max(id), 0) FROM post")).scalar()
+    rows = session.execute(text(
+        "SELECT rowid FROM post_fts WHERE post_fts MATCH :match AND rowid <= :horizon "
+        "ORDER BY rank, rowid LIMIT :limit OFFSET :offset"
+    ), params).all()
+    posts = {p.id: p for p in session.exec(select(models.Post).where(models.Post.id.in_([r[0] for r in rows]))).all()} if rows else {}
+    next_cursor = _encode_cursor(params["offset"] + page_size, params["horizon"]) if len(rows) == page_size else None
+    return [posts[r[0]] for r in rows if r[0] in posts], next_cursor
@@ -0,0 +1,84 @@
+"""Home timelines: fan-out-on-write into TimelineEntry, with pull-on-read for very popular authors."""
+import os
+from typing import List, Optional, Sequence, Tuple
+from sqlalchemy import DateTime, delete, insert, literal
+from sqlmodel import Session, select
+from app import models, pagination
+
+# authors with more followers than this are not fanned out; followers pull their posts at read time
+FANOUT_MAX_FOLLOWERS = int(os.environ.get("VIBE_FANOUT_MAX_FOLLOWERS", "10000"))
+# how many recent posts of a newly followed author are copied into the follower's timeline
+FOLLOW_BACKFILL = int(os.environ.get("VIBE_TIMELINE_BACKFILL", "50"))
+
+_entry = models.TimelineEntry.__table__
+
+
+def fan_out(session: Session, posts: Sequence[models.Post]) -> None:
+    """Push new posts into their author's own timeline and, unless the author is above the
+    fan-out threshold, into every follower's timeline. One INSERT ... SELECT per post."""
+    for post in posts:
+        values = (literal(post.id), literal(post.author_id), literal(post.created_at, DateTime))
+        session.execute(insert(_entry).values(user_id=post.author_id, post_id=post.id, author_id=post.author_id, created_at=post.created_at))
+        popular = select(models.User.follower_count).where(models.User.id == post.author_id).scalar_subquery()
+        followers = select(models.Follow.follower_id, *values).where(
+            models.Follow.followee_id == post.author_id,
+            popular <= FANOUT_MAX_FOLLOWERS,
+        )
+        session.execute(insert(_entry).from_select(["user_id", "post_id", "author_id", "created_at"], followers))
+
+
+def backfill_follow(session: Session, follower_id: int, followee: models.User) -> None:
+    """Copy the followee's most recent posts into the follower's timeline."""
+    if followee.follower_count > FANOUT_MAX_FOLLOWERS or FOLLOW_BACKFILL <= 0:
+        return
+    recent = (
+        select(literal(follower_id), models.Post.id, models.Post.author_id, models.Post.created_at)
+        .where(models.Post.author_id == followee.id)
+        .order_by(models.Post.created_at.desc(), models.Post.id.desc())
+        .limit(FOLLOW_BACKFILL)
+    )
+    session.execute(insert(_entry).from_select(["user_id", "post_id", "author_id", "created_at"], recent))
+
+
+def remove_author(session: Session, follower_id: int, followee_id: int) -> None:
+    session.execute(delete(_entry).where(_entry.c.user_id == follower_id, _entry.c.author_id == followee_id))
+
+
+def page(session: Session, user_id: int, cursor: Optional[str], page_size: int) -> Tuple[List[models.Post], Optional[str]]:
+    """One page of `user_id`'s home timeline, newest first, and the cursor for the next one.
+
+    The cursor follows the last entry scanned, not the last post returned: entries whose post is
+    gone are dropped from the page but must not make the next page start over before them.
+    """
+    stmt = pagination.newest_first(
+        select(models.TimelineEntry.post_id, models.TimelineEntry.created_at).where(models.TimelineEntry.user_id == user_id),
+        cursor, models.TimelineEntry.created_at, models.TimelineEntry.post_id,
+    )
+    keys = {post_id: created_at for post_id, created_at in session.exec(stmt.limit(page_size)).all()}
+
+    # hybrid: merge in recent posts from followed authors that are too popular to fan out
+    stmt_popular = (
+        select(models.Follow.followee_id)
+        .join(models.User, models.User.id == models.Follow.followee_id)
+        .where(models.Follow.follower_id == user_id, models.User.follower_count > FANOUT_MAX_FOLLOWERS)
+    )
+    popular = session.exec(stmt_popular).all()
+    pulled: List[models.Post] = []
+    if popular:
+        stmt_pulled = pagination.newest_first(select(models.Post).where(models.Post.author_id.in_(popular)), cursor)
+        pulled = session.exec(stmt_pulled.limit(page_size)).all()
+        for post in pulled:
+            keys[post.id] = post.created_at
+
+    newest = sorted(keys, key=lambda pid: (keys[pid], pid), reverse=True)[:page_size]
+    loaded = {p.id: p for p in pulled}
+    missing = [pid for pid in newest if pid not in loaded]
+    if missing:
+        loaded.update({p.id: p for p in session.exec(select(models.Post).where(models.Post.id.in_(missing))).all()})
+        # entries outlive the archival of their posts (see app/archive.py)
+        archived = [pid for pid in missing if pid not in loaded]
+        if archived:
+            loaded.update({p.id: p for p in session.exec(select(models.ArchivedPost).where(models.ArchivedPost.id.in_(archived))).all()})
+    next_cursor = pagination.encode_key(keys[newest[-1]], newest[-1]) if len(newest) == page_size else None
+    # entries whose post has since been removed are skipped
+    return [loaded[pid] for pid in newest if pid in loaded], next_cursor
@@ -0,0 +1,107 @@
+"""Per-view version counters stored in the database, and the HTTP validators derived from them.
+
+Write paths bump the counters inside their own transaction, so every worker process
+sees the same validator and a 304 can be answered without touching post data.
+"""
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Iterable, Optional
+from fastapi import Request, Response
+from sqlalchemy import String, cast
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import Session, select
+from app import models
+
+_table = models.ContentVersion.__table__
+
+
+@dataclass(frozen=True)
+class Validator:
+    version: int
+    updated_at: Optional[datetime]
+
+    @property
+    def etag(self) -> str:
+        stamp = int(self.updated_at.timestamp() * 1_000_000) if self.updated_at else 0
+        return f'W/"{self.version}-{stamp}"'
+
+    @property
+    def last_modified(self) -> Optional[str]:
+        return format_datetime(self.updated_at, usegmt=True) if self.updated_at else None
+
+
+def tags_for(*author_ids: Optional[int]) -> list:
+    """Views affected by a write that touched posts of `author_ids`: the feed and those authors' profiles."""
+    return ["feed", *sorted({f"user:{a}" for a in author_ids if a is not None})]
+
+
+def bump(session: Session, tags: Iterable[str]) -> None:
+    now = datetime.now(timezone.utc)
+    rows = [{"name": tag, "version": 1, "updated_at": now} for tag in tags]
+    if not rows:
+        return
+    stmt = sqlite_insert(_table).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[_table.c.name],
+        set_={"version": _table.c.version + 1, "updated_at": stmt.excluded.updated_at},
+    )
+    session.execute(stmt)
+
+
+def _validator(row) -> Validator:
+    if row is None:
+        return Validator(0, None)
+    version, updated_at = row
+    return Validator(version, updated_at.replace(tzinfo=timezone.utc) if updated_at.tzinfo is None else updated_at)
+
+
+def read(session: Session, tag: str) -> Validator:
+    stmt = select(models.ContentVersion.version, models.ContentVersion.updated_at).where(models.ContentVersion.name == tag)
+    return _validator(session.exec(stmt).first())
+
+
+def read_profile(session: Session, username: str) -> Optional[Validator]:
+    """Validator for a user's profile, or None if the user does not exist. One indexed query."""
+    stmt = (
+        select(models.User.id, models.ContentVersion.version, models.ContentVersion.updated_at)
+        .outerjoin(models.ContentVersion, models.ContentVersion.name == "user:" + cast(models.User.id, String))
+        .where(models.User.username == username)
+    )
+    row = session.exec(stmt).first()
+    if row is None:
+        return None
+    return _validator(row[1:] if row[1] is not None else None)
+
+
+def not_modified(request: Request, validator: Validator) -> bool:
+    """Evaluate If-None-Match (preferred) or If-Modified-Since against `validator`."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [t.strip() for t in if_none_match.split(",")]
+        # weak comparison: W/"x" matches "x"
+        plain = validator.etag[2:]
+        return "*" in tags or any(t == validator.etag or t == plain or t[2:] == plain for t in tags)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and validator.updated_at is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return validator.updated_at.replace(microsecond=0) <= since
+    return False
+
+
+def set_headers(response: Response, validator: Validator, cache_control: str) -> None:
+    response.headers["ETag"] = validator.etag
+    response.headers["Cache-Control"] = cache_control
+    if validator.last_modified:
+        response.headers["Last-Modified"] = validator.last_modified
+
+
+def not_modified_response(validator: Validator, cache_control: str) -> Response:
+    response = Response(status_code=304)
+    set_headers(response, validator, cache_control)
+    return response
@@ -51,16 +51,18 @@ async function createPost(){
   const content = el('post_content').value.trim();
   if(!content) return alert('Empty post');
   const r = await api('/posts', {method:'POST', json:{content}});
-  if(r && r.id){ el('post_content').value = ''; await refreshFeed(); }
+  if(r && r.id){ el('post_content').value = ''; if(live) addPost(r); else await refreshFeed(); }
   else alert(JSON.stringify(r));
 }
 
 function makePostNode(p){
   const d = document.createElement('div'); d.className='post';
-  d.innerHTML = `<div class="meta">#${p.id} by ${p.author_id} at ${p.created_at}</div><div class="content">${escapeHtml(p.content)}</div><div class="actions"><button data-id="${p.id}" class="like">Like (${p.likes})</button></div>`;
+  d.id = `post-${p.id}`;
+  d.innerHTML = `<div class="meta">#${p.id} by ${p.author_id} at ${p.created_at}</div><div class="content">${escapeHtml(p.content)}</div><div class="actions"><button data-id="${p.id}" data-likes="${p.likes}" class="like">Like (${p.likes})</button></div>`;
   d.querySelector('.like').addEventListener('click', async e=>{
+    // with a live connection the like event updates the count
     const id = e.target.dataset.id; const res = await api(`/posts/${id}/like`, {method:'POST'});
-    if(res && res.status==='ok') refreshFeed(); else alert(JSON.stringify(res));
+    if(res && res.status==='ok'){ if(!live) refreshFeed(); } else alert(JSON.stringify(res));
   });
   return d;
 }
@@ -75,6 +77,31 @@ async function refreshFeed(){
   } else { container.textContent = JSON.stringify(feed); }
 }
 
+// live updates: new posts and like deltas are pushed over server-sent events
+let live = false;
+
+function addPost(p){
+  if(el(`post-${p.id}`)) return;
+  el('posts').prepend(makePostNode(p));
+}
+
+function applyLike(d){
+  const btn = document.querySelector(`#post-${d.post_id} .like`);
+  if(!btn) return;
+  const likes = Number(btn.dataset.likes) + d.delta;
+  btn.dataset.likes = likes; btn.textContent = `Like (${likes})`;
+}
+
+function connectLive(){
+  if(!window.EventSource) return;
+  const source = new EventSource(API_BASE + '/events');
+  // after a (re)connect we may have missed events, so resync once from /feed
+  source.onopen = ()=>{ live = true; refreshFeed(); };
+  source.onerror = ()=>{ live = false; };
+  source.addEventListener('post', e=> addPost(JSON.parse(e.data)));
+  source.addEventListener('like', e=> applyLike(JSON.parse(e.data)));
+}
+
 el('btn_register').addEventListener('click', register);
 el('btn_login').addEventListener('click', login);
 el('btn_logout').addEventListener('click', logout);
@@ -84,3 +111,4 @@ el('btn_refresh').addEventListener('click', refreshFeed);
 // initial load
 if(getToken()){ el('me').style.display='block'; }
 refreshFeed();
+connectLive();
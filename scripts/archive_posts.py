@@ -0,0 +1,20 @@
+#!/usr/bin/env python3
+"""Move threads older than the retention horizon into the archive tables (safe to re-run or interrupt)."""
+import argparse
+from app import archive, db
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--days", type=float, default=archive.AFTER_DAYS, help="archive threads with no post newer than this many days")
+    parser.add_argument("--batch-size", type=int, default=archive.BATCH_SIZE, help="threads per transaction")
+    parser.add_argument("--pause-ms", type=float, default=archive.PAUSE * 1000, help="sleep between batches")
+    parser.add_argument("--max-batches", type=int, default=None)
+    args = parser.parse_args()
+    db.init_db()
+    totals = archive.run(db._engine, archive.horizon(args.days), args.batch_size, args.pause_ms / 1000, args.max_batches)
+    print(f"Archived {totals['threads']} threads ({totals['posts']} posts, {totals['likes']} likes) in {totals['batches']} batches")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+#!/usr/bin/env python3
+"""Recompute the denormalized like/reply counters on every post."""
+from sqlmodel import Session
+from app import db, maintenance
+
+
+def main():
+    db.init_db()
+    with Session(db._engine) as session:
+        repaired = maintenance.backfill_post_counters(session)
+    print(f"Repaired counters on {repaired} posts")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""Drive load against the API and record throughput, latency percentiles and SQL statements per request.
+
+In-process (default) the app runs inside this process on an httpx ASGI transport, against the
+database given by --db. SQL statements are counted through SQLAlchemy engine events. With
+--base-url the requests go to a running server instead, e.g. a local uvicorn, and SQL counts
+are not available. Start that server with a large VIBE_RL_MAX and VIBE_RL_BATCH_ITEMS so the
+rate limiter does not skew the results.
+
+    PYTHONPATH=. python3 scripts/bench_load.py --db sqlite:////tmp/bench.db --seed-data --out before.json
+    PYTHONPATH=. python3 scripts/bench_load.py --db sqlite:////tmp/bench.db --out after.json --compare before.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+import bench_seed
+
+SCENARIOS = ["feed", "feed_offset", "feed_cursor", "profile", "create_post", "like", "login"]
+
+
+class Scenario:
+    """One request shape. `make(rng)` returns (method, path, kwargs); `ok` lists accepted status codes."""
+
+    def __init__(self, name: str, make: Callable, ok=(200,)):
+        self.name = name
+        self.make = make
+        self.ok = set(ok)
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, round(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class SqlCounter:
+    """Counts statements executed on the app's engines while installed (in-process runs only)."""
+
+    def __init__(self):
+        self.count = 0
+
+    def install(self, db) -> None:
+        from sqlalchemy import event
+        engines = [db._engine] + ([db._async_engine.sync_engine] if db._async_engine is not None else [])
+        for engine in engines:
+            event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args) -> None:
+        self.count += 1
+
+
+async def run_scenario(client, scenario: Scenario, requests: int, duration: float, concurrency: int, rng: random.Random) -> Dict:
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    errors = 0
+    deadline = time.perf_counter() + duration if duration else None
+    remaining = [requests]
+
+    async def worker():
+        nonlocal errors
+        while True:
+            if deadline is not None:
+                if time.perf_counter() >= deadline:
+                    return
+            else:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            method, path, kwargs = scenario.make(rng)
+            t0 = time.perf_counter()
+            try:
+                r = await client.request(method, path, **kwargs)
+                status = r.status_code
+            except Exception:
+                status = 0
+            latencies.append(time.perf_counter() - t0)
+            statuses[status] = statuses.get(status, 0) + 1
+            if status not in scenario.ok:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    ms = [v * 1000 for v in latencies]
+    return {
+        "requests": len(ms),
+        "errors": errors,
+        "statuses": {str(k): v for k, v in sorted(statuses.items())},
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(ms) / elapsed, 1) if elapsed else 0.0,
+        "mean_ms": round(sum(ms) / len(ms), 2) if ms else 0.0,
+        "p50_ms": round(percentile(ms, 50), 2),
+        "p95_ms": round(percentile(ms, 95), 2),
+        "p99_ms": round(percentile(ms, 99), 2),
+        "max_ms": round(ms[-1], 2) if ms else 0.0,
+    }
+
+
+async def build_scenarios(client, args, rng: random.Random) -> Dict[str, Scenario]:
+    """Log in a pool of bench users and collect feed cursors, then describe each scenario."""
+    cum = bench_seed.zipf_cum_weights(args.users, args.skew)
+    ranks = range(args.users)
+
+    def popular_user(r: random.Random) -> str:
+        return bench_seed.username(r.choices(ranks, cum_weights=cum)[0])
+
+    tokens = []
+    for rank in range(min(args.logins, args.users)):
+        r = await client.post("/token", data={"username": bench_seed.username(rank), "password": args.password})
+        r.raise_for_status()
+        tokens.append({"Authorization": f"Bearer {r.json()['access_token']}"})
+
+    cursors: List[Optional[str]] = [None]
+    for _ in range(args.depth):
+        params = {"page_size": args.page_size}
+        if cursors[-1]:
+            params["cursor"] = cursors[-1]
+        r = await client.get("/feed", params=params)
+        r.raise_for_status()
+        if not r.headers.get("X-Next-Cursor"):
+            break
+        cursors.append(r.headers["X-Next-Cursor"])
+    post_ids = [p["id"] for p in (await client.get("/feed", params={"page_size": 100})).json()]
+    counter = iter(range(10 ** 9))
+
+    def feed(r):
+        return "GET", "/feed", {"params": {"page_size": args.page_size}}
+
+    def feed_offset(r):
+        return "GET", "/feed", {"params": {"page": r.randrange(args.depth), "page_size": args.page_size}}
+
+    def feed_cursor(r):
+        cursor = r.choice(cursors)
+        return "GET", "/feed", {"params": {"page_size": args.page_size, **({"cursor": cursor} if cursor else {})}}
+
+    def profile(r):
+        return "GET", f"/users/{popular_user(r)}", {}
+
+    def create_post(r):
+        return "POST", "/posts", {"json": {"content": f"load post {next(counter)}"}, "headers": r.choice(tokens)}
+
+    def like(r):
+        return "POST", f"/posts/{r.choice(post_ids)}/like", {"headers": r.choice(tokens)}
+
+    def login(r):
+        return "POST", "/token", {"data": {"username": popular_user(r), "password": args.password}}
+
+    return {
+        "feed": Scenario("feed", feed),
+        "feed_offset": Scenario("feed_offset", feed_offset),
+        "feed_cursor": Scenario("feed_cursor", feed_cursor),
+        "profile": Scenario("profile", profile),
+        "create_post": Scenario("create_post", create_post),
+        # likes pick random (user, post) pairs; liking is idempotent, so repeats also return 200
+        "like": Scenario("like", like),
+        "login": Scenario("login", login),
+    }
+
+
+async def run(args) -> Dict:
+    import httpx
+
+    sql = None
+    if args.base_url:
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=60)
+    else:
+        from app import db
+        import app.main as main
+        db.init_db()
+        sql = SqlCounter()
+        sql.install(db)
+        client = httpx.AsyncClient(app=main.app, base_url="http://bench", timeout=60)
+
+    rng = random.Random(args.seed)
+    results = {}
+    try:
+        await _run_all(client, args, rng, sql, results)
+    finally:
+        if not args.base_url:
+            main.passwords.service.shutdown()
+    return {"meta": _meta(args), "scenarios": results}
+
+
+async def _run_all(client, args, rng: random.Random, sql: Optional[SqlCounter], results: Dict) -> None:
+    async with client:
+        scenarios = await build_scenarios(client, args, rng)
+        for name in args.scenarios:
+            scenario = scenarios[name]
+            # warm caches and pools; not measured
+            await run_scenario(client, scenario, args.warmup, 0, args.concurrency, rng)
+            before = sql.count if sql else 0
+            result = await run_scenario(client, scenario, args.requests, args.duration, args.concurrency, rng)
+            result["sql_per_request"] = round((sql.count - before) / result["requests"], 2) if sql and result["requests"] else None
+            results[name] = result
+            print(f"{name:12s} {result['throughput_rps']:9.1f} req/s  p50 {result['p50_ms']:7.2f}  p95 {result['p95_ms']:7.2f}  "
+                  f"p99 {result['p99_ms']:7.2f} ms  sql/req {result['sql_per_request']}  errors {result['errors']}", file=sys.stderr)
+
+
+def _meta(args) -> Dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    config = {k: v for k, v in vars(args).items() if k not in ("out", "compare")}
+    env = {k: v for k, v in os.environ.items() if k.startswith("VIBE_")}
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": config,
+        "env": env,
+    }
+
+
+def compare(baseline: Dict, current: Dict) -> str:
+    """A table of throughput and latency changes per scenario (positive % = more req/s or more ms)."""
+    lines = [f"{'scenario':12s} {'req/s':>18s} {'p50 ms':>18s} {'p95 ms':>18s} {'p99 ms':>18s} {'sql/req':>12s}"]
+    for name, cur in current["scenarios"].items():
+        base = baseline["scenarios"].get(name)
+        if base is None:
+            continue
+        cells = []
+        for key in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms"):
+            change = (cur[key] - base[key]) / base[key] * 100 if base[key] else 0.0
+            cells.append(f"{base[key]:>7} -> {cur[key]:<7}{change:+4.0f}%")
+        cells.append(f"{base.get('sql_per_request')} -> {cur.get('sql_per_request')}")
+        lines.append(f"{name:12s} " + " ".join(f"{c:>18s}" for c in cells))
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", help="database URL for in-process runs (default: VIBE_DATABASE_URL)")
+    parser.add_argument("--base-url", help="benchmark a running server instead of the in-process app")
+    parser.add_argument("--seed-data", action="store_true", help="seed the database first (in-process only)")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--requests", type=int, default=500, help="requests per scenario (ignored with --duration)")
+    parser.add_argument("--duration", type=float, default=0, help="seconds per scenario instead of a request count")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--depth", type=int, default=20, help="how many feed pages deep the feed_* scenarios go")
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--logins", type=int, default=20, help="bench users logged in for the write scenarios")
+    parser.add_argument("--out", help="write JSON results here (default: bench-results/<timestamp>.json)")
+    parser.add_argument("--compare", help="print changes against an earlier results file")
+    bench_seed.add_arguments(parser)
+    args = parser.parse_args()
+
+    if args.db:
+        os.environ["VIBE_DATABASE_URL"] = args.db
+    if not args.base_url:
+        # the in-process app reads these at import time: keep the rate limiter and console logging out of the numbers
+        os.environ.setdefault("VIBE_RL_MAX", str(10 ** 9))
+        os.environ.setdefault("VIBE_RL_BATCH_ITEMS", str(10 ** 9))
+        os.environ.setdefault("VIBE_LOG_CONSOLE", "0")
+        os.environ.setdefault("VIBE_LOG_DIR", tempfile.mkdtemp(prefix="vibe-bench-logs-"))
+    if args.seed_data:
+        if args.base_url:
+            parser.error("--seed-data only works in-process; run scripts/bench_seed.py against the server's database")
+        print(json.dumps(bench_seed.seed_from_args(args)), file=sys.stderr)
+
+    report = asyncio.run(run(args))
+    out = args.out or os.path.join("bench-results", datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ") + ".json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {out}", file=sys.stderr)
+    if args.compare:
+        with open(args.compare) as f:
+            print(compare(json.load(f), report))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""Bulk-create a reproducible benchmark dataset: users, posts, replies and likes with skewed popularity.
+
+User `bench000000` is the most popular, `bench000001` the next, and so on (Zipf weights with
+exponent `--skew`), both as authors and as like targets. The same `--seed` always yields the
+same dataset. Every account has the password given by `--password`.
+
+    PYTHONPATH=. python3 scripts/bench_seed.py --db sqlite:///./bench.db --users 1000 --posts 20000
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+
+def username(rank: int) -> str:
+    return f"bench{rank:06d}"
+
+
+def zipf_cum_weights(n: int, skew: float) -> List[float]:
+    """Cumulative weights for ranks 0..n-1, weight(rank) = 1 / (rank + 1) ** skew."""
+    return list(itertools.accumulate(1.0 / (rank + 1) ** skew for rank in range(n)))
+
+
+def seed(users: int = 1000, posts: int = 20000, reply_ratio: float = 0.3, likes: int = 50000,
+         skew: float = 1.1, days: int = 30, rng_seed: int = 42, password: str = "password",
+         chunk: int = 5000) -> Dict[str, float]:
+    """Insert the dataset into the database configured by VIBE_DATABASE_URL. Returns counts and timing."""
+    from sqlalchemy import insert, text
+    from sqlmodel import Session, select
+    from app import db, maintenance, models, passwords, versions
+
+    started = time.perf_counter()
+    rng = random.Random(rng_seed)
+    db.init_db()
+    cum = zipf_cum_weights(users, skew)
+    # one hash for every account: hashing per user would dominate seeding time
+    hashed = passwords.hash_password(password, passwords.argon2_params())
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    start = now - timedelta(days=days)
+
+    def insert_chunks(session: Session, table, rows: List[dict]) -> None:
+        for i in range(0, len(rows), chunk):
+            session.execute(insert(table), rows[i:i + chunk])
+
+    with Session(db._engine) as session:
+        first_user = (session.execute(text('SELECT COALESCE(MAX(id), 0) FROM "user"')).scalar() or 0) + 1
+        first_post = (session.execute(text("SELECT COALESCE(MAX(id), 0) FROM post")).scalar() or 0) + 1
+        user_ids = list(range(first_user, first_user + users))
+        insert_chunks(session, models.User.__table__, [
+            {"id": uid, "username": username(rank), "display_name": f"Bench User {rank}",
+             "hashed_password": hashed, "created_at": start}
+            for rank, uid in enumerate(user_ids)
+        ])
+
+        # timestamps increase with ids, as they would in production
+        step = (now - start) / max(1, posts)
+        authors = rng.choices(user_ids, cum_weights=cum, k=posts)
+        rows, top_level = [], []
+        for i in range(posts):
+            post_id = first_post + i
+            parent_id = None
+            if top_level and rng.random() < reply_ratio:
+                parent_id = rng.choice(top_level[-500:])
+            else:
+                top_level.append(post_id)
+            rows.append({"id": post_id, "author_id": authors[i], "content": f"bench post {i} " + rng.choice(_WORDS),
+                         "created_at": start + step * i, "parent_id": parent_id})
+        insert_chunks(session, models.Post.__table__, rows)
+
+        # likes go to posts of popular authors; (user, post) pairs are unique
+        by_author: Dict[int, List[int]] = {}
+        for row in rows:
+            by_author.setdefault(row["author_id"], []).append(row["id"])
+        pairs = set()
+        targets = rng.choices(user_ids, cum_weights=cum, k=likes * 2)
+        for author in targets:
+            if len(pairs) >= likes:
+                break
+            if author in by_author:
+                pairs.add((rng.choice(user_ids), rng.choice(by_author[author])))
+        insert_chunks(session, models.Like.__table__, [
+            {"user_id": uid, "post_id": pid, "created_at": now} for uid, pid in sorted(pairs)
+        ])
+        # every author sees their own posts on /timeline
+        own = select(models.Post.author_id, models.Post.id, models.Post.author_id, models.Post.created_at).where(models.Post.id >= first_post)
+        session.execute(insert(models.TimelineEntry.__table__).from_select(["user_id", "post_id", "author_id", "created_at"], own))
+        # a running server must not answer 304 with validators from before the seed
+        versions.bump(session, versions.tags_for(*user_ids))
+        session.commit()
+        maintenance.backfill_post_counters(session)
+
+    return {
+        "users": users, "posts": posts, "replies": posts - len(top_level), "likes": len(pairs),
+        "first_user_id": first_user, "first_post_id": first_post,
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+_WORDS = ["coffee", "deploy", "weekend", "music", "latency", "garden", "python", "sqlite", "rain", "launch"]
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--posts", type=int, default=20000)
+    parser.add_argument("--reply-ratio", type=float, default=0.3)
+    parser.add_argument("--likes", type=int, default=50000)
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent for author/like popularity")
+    parser.add_argument("--days", type=int, default=30, help="spread post timestamps over this many days")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--password", default="password")
+
+
+def seed_from_args(args: argparse.Namespace) -> Dict[str, float]:
+    return seed(users=args.users, posts=args.posts, reply_ratio=args.reply_ratio, likes=args.likes,
+                skew=args.skew, days=args.days, rng_seed=args.seed, password=args.password)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", help="database URL (default: VIBE_DATABASE_URL or sqlite:///./vibe.db)")
+    add_arguments(parser)
+    args = parser.parse_args()
+    if args.db:
+        os.environ["VIBE_DATABASE_URL"] = args.db
+    print(json.dumps(seed_from_args(args), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+#!/usr/bin/env python3
+"""Fingerprint and precompress the frontend into frontend/dist (served at /ui when present)."""
+import argparse
+from app import assets
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--src", default=assets.SOURCE_DIR)
+    parser.add_argument("--dst", default=assets.BUILD_DIR)
+    args = parser.parse_args()
+    manifest = assets.build(args.src, args.dst)
+    for original, fingerprinted in sorted(manifest.items()):
+        print(f"{original} -> {fingerprinted}")
+    print(f"Wrote {args.dst}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,36 +1,38 @@
 #!/usr/bin/env python3
-import requests
-
-BASE = "http://localhost:8000"
-
-def register(username, display_name, password):
-    r = requests.post(f"{BASE}/register", json={"username":username, "display_name":display_name, "password":password})
-    r.raise_for_status()
-    return r.json()
-
-def login(username, password):
-    r = requests.post(f"{BASE}/token", data={"username":username, "password":password})
-    r.raise_for_status()
-    return r.json()["access_token"]
-
-def create_post(token, content, parent_id=None):
-    headers = {"Authorization": f"Bearer {token}"}
-    payload = {"content": content}
-    if parent_id is not None:
-        payload["parent_id"] = parent_id
-    r = requests.post(f"{BASE}/posts", json=payload, headers=headers)
-    r.raise_for_status()
-    return r.json()
-
-def feed(page=0, page_size=50):
-    r = requests.get(f"{BASE}/feed", params={"page": page, "page_size": page_size})
-    r.raise_for_status()
-    return r.json()
+"""Example use of the `vibe_client` SDK against a running server (default http://localhost:8000)."""
+import asyncio
+import sys
+
+from vibe_client import AsyncClient, Client, VibeError
+
+BASE = sys.argv[1] if len(sys.argv) > 1 else "http://localhost:8000"
+
+
+def sync_example():
+    with Client(BASE) as client:
+        print("Registering user alice2...")
+        try:
+            client.register("alice2", "secret", display_name="Alice Two")
+        except VibeError as error:
+            if error.status_code != 400:
+                raise
+            client.login("alice2", "secret")
+        print("Got token... creating a post")
+        print(client.create_post("Hello from python client"))
+        print("Feed:\n", client.feed(page_size=10).items)
+
+
+async def async_example():
+    async with AsyncClient(BASE) as client:
+        await client.login("alice2", "secret")
+        results = await client.post_many([f"bulk post {i}" for i in range(20)], concurrency=4, batch_size=5)
+        print(f"Created {sum(r['ok'] for r in results)} posts in bulk")
+        count = 0
+        async for _ in client.iter_user_posts("alice2", page_size=50):
+            count += 1
+        print(f"alice2 has {count} posts")
+
 
 if __name__ == "__main__":
-    print("Registering user alice...")
-    print(register("alice2", "Alice Two", "secret"))
-    token = login("alice2", "secret")
-    print("Got token... creating a post")
-    print(create_post(token, "Hello from python client"))
-    print("Feed:\n", feed())
+    sync_example()
+    asyncio.run(async_example())
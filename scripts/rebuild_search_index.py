@@ -0,0 +1,15 @@
+#!/usr/bin/env python3
+"""Create (if needed) and fully rebuild the FTS5 index behind GET /search."""
+from sqlmodel import Session
+from app import db, search
+
+
+def main():
+    db.init_db()
+    with Session(db._engine) as session:
+        search.rebuild(session)
+    print("Rebuilt the post search index")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""Copy the primary SQLite database (VIBE_DATABASE_URL) into every file in VIBE_DATABASE_REPLICA_URLS.
+
+Meant for trying read replicas locally: run it once to create the replicas and again (or in a loop
+with --every) to let them catch up. The copy uses SQLite's backup API, so it is consistent while the
+app is writing, and it writes into the existing replica files so open replica connections see it.
+"""
+import argparse
+import os
+import sqlite3
+import time
+
+from sqlalchemy.engine import make_url
+from app import db
+
+
+def _path(url: str) -> str:
+    parsed = make_url(url)
+    if not parsed.drivername.startswith("sqlite") or not parsed.database or parsed.database == ":memory:":
+        raise SystemExit(f"not a SQLite file URL: {url}")
+    return parsed.database
+
+
+def sync(primary: str, replicas) -> None:
+    source = sqlite3.connect(primary)
+    try:
+        for replica in replicas:
+            target = sqlite3.connect(replica)
+            try:
+                source.backup(target)
+            finally:
+                target.close()
+    finally:
+        source.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--every", type=float, default=0, help="repeat every N seconds (default: copy once)")
+    args = parser.parse_args()
+    primary = _path(os.environ.get("VIBE_DATABASE_URL", "sqlite:///./vibe.db"))
+    replicas = [_path(url) for url in db.replica_urls()]
+    if not replicas:
+        raise SystemExit("set VIBE_DATABASE_REPLICA_URLS to the replica files")
+    while True:
+        sync(primary, replicas)
+        print(f"Copied {primary} to {', '.join(replicas)}")
+        if args.every <= 0:
+            break
+        time.sleep(args.every)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import create_engine, func, select
+from sqlmodel import Session, SQLModel
+from app import archive, models
+
+
+def test_newest_post_is_never_archived_so_ids_stay_unique(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'archive.db'}")
+    SQLModel.metadata.create_all(engine)
+    old = datetime.now(timezone.utc) - timedelta(days=365)
+    with Session(engine) as session:
+        session.add_all([models.Post(author_id=1, content=f"p{i}", created_at=old + timedelta(minutes=i)) for i in range(5)])
+        session.commit()
+    assert archive.run(engine, pause=0)["posts"] == 4
+    with Session(engine) as session:
+        session.add(models.Post(author_id=1, content="fresh"))
+        session.commit()
+        assert session.execute(select(func.max(models.Post.id))).scalar() == 6
+        rows = archive.newest_first(session, None, 10)
+        assert [r.content for r in rows] == ["fresh", "p4", "p3", "p2", "p1", "p0"]
+        assert [r.archived for r in rows] == [False, False, True, True, True, True]
+        assert archive.restore(session, [2]) == 1 and archive.restore(session, [2]) == 0
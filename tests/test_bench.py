@@ -0,0 +1,43 @@
+import argparse
+import asyncio
+import os
+import sys
+from importlib import reload
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "scripts"))
+import bench_load  # noqa: E402
+import bench_seed  # noqa: E402
+
+
+def test_seed_and_load_smoke(tmp_path, monkeypatch):
+    monkeypatch.setenv("VIBE_DATABASE_URL", f"sqlite:///{tmp_path / 'bench.db'}")
+    monkeypatch.setenv("VIBE_RL_MAX", "100000")
+    import app.db as db_mod
+    reload(db_mod)
+    import app.main as main_mod
+    reload(main_mod)
+
+    summary = bench_seed.seed(users=20, posts=200, likes=300, rng_seed=1)
+    assert summary["posts"] == 200 and summary["likes"] == 300 and 0 < summary["replies"] < 200
+
+    parser = argparse.ArgumentParser()
+    bench_seed.add_arguments(parser)
+    args = parser.parse_args(["--users", "20"])
+    args.base_url, args.requests, args.duration, args.warmup, args.concurrency = None, 10, 0, 2, 2
+    args.depth, args.page_size, args.logins = 3, 20, 1
+    args.scenarios = ["feed_cursor", "profile", "create_post", "like"]
+    args.out = args.compare = None
+    report = asyncio.run(bench_load.run(args))
+
+    for name in args.scenarios:
+        result = report["scenarios"][name]
+        assert result["requests"] == 10 and result["errors"] == 0
+        assert result["p50_ms"] <= result["p95_ms"] <= result["p99_ms"] and result["sql_per_request"] > 0
+    assert "feed_cursor" in bench_load.compare(report, report)
+
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 101))
+    assert bench_load.percentile(values, 50) == 50
+    assert bench_load.percentile(values, 99) == 99
+    assert bench_load.percentile([], 95) == 0.0
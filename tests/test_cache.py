@@ -0,0 +1,102 @@
+import threading
+import time
+from app.cache import TTLCache
+
+
+def test_lru_eviction_and_counters():
+    c = TTLCache(maxsize=2, ttl=60)
+    c.get_or_set("a", lambda: (1, []))
+    c.get_or_set("b", lambda: (2, []))
+    assert c.get_or_set("a", lambda: (99, [])) == 1  # hit, "a" becomes most recent
+    c.get_or_set("c", lambda: (3, []))  # evicts "b"
+    assert c.get_or_set("b", lambda: (20, [])) == 20
+    stats = c.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 4 and stats["evictions"] == 2
+
+
+def test_ttl_expiry():
+    c = TTLCache(maxsize=8, ttl=0.05)
+    c.get_or_set("k", lambda: ("old", []))
+    time.sleep(0.1)
+    assert c.get_or_set("k", lambda: ("new", [])) == "new"
+
+
+def test_tag_invalidation():
+    c = TTLCache(maxsize=8, ttl=60)
+    c.get_or_set("feed", lambda: (1, ["feed"]))
+    c.get_or_set("u1", lambda: (1, ["user:1"]))
+    c.get_or_set("u2", lambda: (1, ["user:2"]))
+    c.invalidate("feed", "user:1")
+    assert c.get_or_set("feed", lambda: (2, ["feed"])) == 2
+    assert c.get_or_set("u1", lambda: (2, ["user:1"])) == 2
+    assert c.get_or_set("u2", lambda: (2, ["user:2"])) == 1
+
+
+def test_single_flight_coalesces_misses():
+    c = TTLCache(maxsize=8, ttl=60)
+    calls = []
+    release = threading.Event()
+
+    def compute():
+        calls.append(1)
+        release.wait(2)
+        return "v", []
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(c.get_or_set("k", compute))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    time.sleep(0.1)
+    release.set()
+    for t in threads:
+        t.join()
+    assert calls == [1]
+    assert results == ["v"] * 8
+
+
+def test_disabled_cache_always_computes():
+    c = TTLCache(maxsize=8, ttl=0)
+    c.get_or_set("k", lambda: (1, []))
+    assert c.get_or_set("k", lambda: (2, [])) == 2
+
+
+def test_async_single_flight_coalesces_misses():
+    import asyncio
+    c = TTLCache(maxsize=8, ttl=60)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "v", []
+
+    async def main():
+        return await asyncio.gather(*(c.aget_or_set("k", compute) for _ in range(8)))
+
+    assert asyncio.run(main()) == ["v"] * 8
+    assert calls == [1]
+
+
+def test_async_waiters_take_over_when_the_leader_is_cancelled():
+    import asyncio
+    c = TTLCache(maxsize=8, ttl=60)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "v", []
+
+    async def main():
+        leader = asyncio.ensure_future(c.aget_or_set("k", compute))
+        await asyncio.sleep(0)
+        waiters = [asyncio.ensure_future(c.aget_or_set("k", compute)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        results = await asyncio.gather(*waiters)
+        assert leader.cancelled()
+        return results
+
+    assert asyncio.run(main()) == ["v"] * 3
+    assert calls == [1, 1]
+    assert not c._ainflight
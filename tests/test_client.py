@@ -0,0 +1,115 @@
+import asyncio
+import contextlib
+from importlib import reload
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from vibe_client import AsyncClient, Client, RateLimited, RetryPolicy, VibeError
+
+NO_WAIT = RetryPolicy(attempts=3, base=0)
+
+
+@pytest.fixture()
+def app(tmp_path, monkeypatch):
+    monkeypatch.setenv("VIBE_DATABASE_URL", f"sqlite:///{tmp_path / 'client.db'}")
+    import app.db as db_mod
+    reload(db_mod)
+    import app.main as main_mod
+    reload(main_mod)
+    import app.ratelimit as rl
+    rl._clear_store_for_tests()
+    main_mod.db.init_db()
+    return main_mod.app
+
+
+def mock_client(handler, **kwargs):
+    return Client(http=httpx.Client(transport=httpx.MockTransport(handler), base_url="http://vibe"), retry=NO_WAIT, **kwargs)
+
+
+def test_retries_429_honoring_retry_after_but_not_unsafe_posts():
+    calls = []
+
+    def handler(request):
+        calls.append(request.method)
+        if len(calls) < 3:
+            return httpx.Response(429 if request.method == "POST" else 503, json={"detail": "busy"}, headers={"Retry-After": "0"})
+        return httpx.Response(200, json=[])
+
+    client = mock_client(handler)
+    assert client.feed().items == [] and calls == ["GET"] * 3
+    calls.clear()
+    assert client.like_many([1]) == [] and calls == ["POST"] * 3
+
+    # a 503 on a POST may have been applied, so it is not repeated
+    client = mock_client(lambda request: httpx.Response(503, json={"detail": "down"}))
+    with pytest.raises(VibeError) as error:
+        client.create_post("hi")
+    assert error.value.status_code == 503
+    client = mock_client(lambda request: httpx.Response(429, json={"detail": "slow down"}, headers={"Retry-After": "0"}))
+    with pytest.raises(RateLimited) as error:
+        client.create_post("hi")
+    assert error.value.retry_after == 0
+
+
+def test_backoff_is_jittered_and_capped():
+    policy = RetryPolicy(base=1, cap=4)
+    delays = [policy.delay(5) for _ in range(200)]
+    assert all(0 <= d <= 4 for d in delays) and len(set(delays)) > 100
+    assert policy.delay(0, httpx.Response(429, headers={"Retry-After": "7"})) >= 7
+
+
+def test_logs_in_again_when_the_token_expires():
+    tokens = iter(["t1", "t2"])
+
+    def handler(request):
+        if request.url.path == "/token":
+            return httpx.Response(200, json={"access_token": next(tokens)})
+        if request.headers.get("authorization") != "Bearer t2":
+            return httpx.Response(401, json={"detail": "expired"})
+        return httpx.Response(200, json={"status": "ok"})
+
+    client = mock_client(handler)
+    assert client.login("ann", "secret") == "t1"
+    client.follow("bob")
+    assert client.token == "t2"
+
+
+def test_sync_client_against_app(app):
+    with Client(http=TestClient(app), retry=NO_WAIT) as client:
+        client.register("sdk_sync", "password")
+        results = client.post_many([f"post {i}" for i in range(230)] + [{"content": "orphan", "parent_id": 99999}])
+        assert [r["index"] for r in results] == list(range(231))
+        assert all(r["ok"] for r in results[:230]) and results[230]["error"] == "parent post not found"
+        posts = list(client.iter_feed(page_size=40, include_replies="none"))
+        assert [p["content"] for p in posts] == [f"post {i}" for i in reversed(range(230))]
+        assert len(list(client.iter_user_posts("sdk_sync", page_size=100))) == 230
+        root = posts[0]["id"]
+        client.create_post("a reply", parent_id=root)
+        assert [r["content"] for r in client.iter_replies(root)] == ["a reply"]
+        assert client.get_post(root)["reply_count"] == 1
+        with pytest.raises(VibeError) as error:
+            client.like(99999)
+        assert error.value.status_code == 404
+
+
+def test_async_client_against_app(app):
+    async def scenario():
+        http = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://vibe")
+        async with AsyncClient(http=http, retry=NO_WAIT) as client:
+            await client.register("sdk_async", "password")
+            results = await client.post_many([f"async {i}" for i in range(120)], concurrency=3, batch_size=25)
+            assert [r["index"] for r in results] == list(range(120)) and all(r["ok"] for r in results)
+            seen = [p["content"] async for p in client.iter_feed(page_size=30)]
+            assert sorted(seen) == sorted(f"async {i}" for i in range(120))
+            # closing an iterator left early cancels its prefetch
+            async with contextlib.aclosing(client.iter_user_posts("sdk_async", page_size=10)) as posts:
+                async for _ in posts:
+                    break
+            await asyncio.sleep(0)
+            assert asyncio.all_tasks() == {asyncio.current_task()}
+            page = await client.user_posts("sdk_async", page_size=10)
+            assert len(page.items) == 10 and page.next_cursor
+
+    asyncio.run(scenario())
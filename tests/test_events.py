@@ -0,0 +1,51 @@
+import asyncio
+from app.events import Hub, stream
+
+
+def test_publish_fans_out_encoded_frames():
+    hub = Hub(queue_size=4)
+    a, b = hub.subscribe(), hub.subscribe()
+    assert hub.publish("like", {"post_id": 1, "delta": 1}) == 2
+    frame = a.queue.get_nowait()
+    assert frame == b.queue.get_nowait()
+    assert frame.startswith(b"id: 1\nevent: like\n") and b'data: {"post_id":1,"delta":1}' in frame
+    hub.unsubscribe(b)
+    assert hub.publish("like", {}) == 1
+
+
+def test_slow_consumer_is_dropped():
+    hub = Hub(queue_size=2)
+    slow, fast = hub.subscribe(), hub.subscribe()
+    for i in range(3):
+        hub.publish("post", {"id": i})
+        fast.queue.get_nowait()
+    # the slow client's backlog is discarded and its stream is told to end
+    assert slow.closed and slow.queue.qsize() == 1 and slow.queue.get_nowait() is None
+    assert hub.stats() == {"subscribers": 1, "published": 3, "dropped": 1}
+
+
+def test_stream_yields_events_pings_and_ends_on_close():
+    hub = Hub(queue_size=8)
+
+    async def run():
+        frames = stream(hub, heartbeat=0.05)
+        assert (await frames.__anext__()).startswith(b"retry:")
+        hub.publish("post", {"id": 7})
+        assert b"event: post" in await frames.__anext__()
+        assert await frames.__anext__() == b": ping\n\n"
+        hub.close()
+        return [f async for f in frames]
+
+    assert asyncio.run(run()) == []
+    assert hub.stats()["subscribers"] == 0
+
+
+def test_publish_from_another_thread_is_handed_to_the_subscriber_loop():
+    hub = Hub(queue_size=8)
+
+    async def run():
+        sub = hub.subscribe()
+        await asyncio.get_running_loop().run_in_executor(None, hub.publish, "like", {"post_id": 2, "delta": 1})
+        return await asyncio.wait_for(sub.queue.get(), 1)
+
+    assert b'"post_id":2' in asyncio.run(run())
@@ -37,3 +37,37 @@ def test_feed_includes_author_username(client):
     assert isinstance(data, list) and len(data) >= 1
     p = data[0]
     assert 'author_username' in p and p['author_username'] == 'user1'
+
+
+def test_fingerprinted_precompressed_assets(tmp_path, monkeypatch):
+    from app import assets, compression
+    dist = tmp_path / "dist"
+    manifest = assets.build("frontend", str(dist))
+    js = manifest["app.js"]
+    assert js.startswith("app.") and js.endswith(".js") and (dist / (js + ".gz")).exists()
+    index = (dist / "index.html").read_text()
+    assert f"/ui/{js}" in index and f"/ui/{manifest['style.css']}" in index and '"/ui/app.js"' not in index
+
+    monkeypatch.setenv("VIBE_DATABASE_URL", f"sqlite:///{tmp_path / 'test.db'}")
+    monkeypatch.setenv("VIBE_UI_DIR", str(dist))
+    import app.db as db_mod
+    reload(db_mod)
+    import app.main as main_mod
+    reload(main_mod)
+    client = TestClient(main_mod.app)
+
+    r = client.get(f"/ui/{js}", headers={"Accept-Encoding": "gzip"})
+    assert r.headers["content-encoding"] == "gzip" and "immutable" in r.headers["cache-control"]
+    assert r.headers["content-type"].startswith(("application/javascript", "text/javascript"))
+    assert r.text == open("frontend/app.js").read()
+    if compression.brotli is not None:
+        assert client.get(f"/ui/{js}", headers={"Accept-Encoding": "gzip, br"}).headers["content-encoding"] == "br"
+    plain = client.get(f"/ui/{js}", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers and plain.headers["vary"] == "Accept-Encoding"
+    assert client.get(f"/ui/{js}", headers={"Accept-Encoding": "gzip", "If-None-Match": r.headers["etag"]}).status_code == 304
+    # sidecars are only reachable through negotiation, and the manifest not at all
+    for artifact in (f"{js}.gz", "index.html.gz", "manifest.json"):
+        assert client.get(f"/ui/{artifact}").status_code == 404
+
+    page = client.get("/ui/")
+    assert f"/ui/{js}" in page.text and "immutable" not in page.headers["cache-control"]
@@ -0,0 +1,63 @@
+import threading
+from app.likes import LikeBuffer
+
+
+def test_buffer_coalesces_and_flushes_on_size():
+    batches = []
+    flushed = threading.Event()
+
+    def flush(changes):
+        batches.append(dict(changes))
+        flushed.set()
+
+    buf = LikeBuffer(flush, interval=60, size=3)
+    buf.add(1, 10)
+    buf.add(1, 10, liked=False)
+    buf.add(2, 10)
+    assert len(buf) == 2 and not batches
+    buf.add(3, 11)
+    assert flushed.wait(5)
+    assert batches == [{(1, 10): False, (2, 10): True, (3, 11): True}]
+    buf.close()
+    assert buf.flushes == 1 and buf.flushed == 3
+
+
+def test_close_flushes_pending():
+    batches = []
+    buf = LikeBuffer(batches.append, interval=60, size=100)
+    buf.add(1, 1)
+    buf.close()
+    assert batches == [{(1, 1): True}]
+    assert buf.flush() == 0
+
+
+def test_failed_flush_keeps_batch_without_overwriting_newer_requests():
+    batches = []
+    failures = [RuntimeError("database is locked")]
+
+    def flush(changes):
+        if failures:
+            buf.add(1, 10, liked=False)
+            raise failures.pop()
+        batches.append(dict(changes))
+
+    buf = LikeBuffer(flush, interval=60, size=100)
+    buf.add(1, 10)
+    buf.add(2, 10)
+    try:
+        buf.flush()
+    except RuntimeError:
+        pass
+    # the unlike that arrived during the failed flush is newer than the batched like
+    assert len(buf) == 2 and buf.flushes == 0
+    assert buf.flush() == 2
+    assert batches == [{(1, 10): False, (2, 10): True}]
+    buf.close()
+
+
+def test_add_after_close_writes_through():
+    batches = []
+    buf = LikeBuffer(batches.append, interval=60, size=100)
+    buf.close()
+    buf.add(3, 30)
+    assert batches == [{(3, 30): True}] and len(buf) == 0
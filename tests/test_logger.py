@@ -0,0 +1,31 @@
+import logging
+import queue
+from app import logger
+
+
+def test_fields_rendered_in_text_sinks():
+    record = logging.makeLogRecord({"msg": "post_created", "levelname": "INFO", "post_id": 7, "username": "bob"})
+    assert logger.FieldsFormatter("%(message)s").format(record) == "post_created post_id=7 username=bob"
+    assert "- fields: post_id=7 username=bob" in logger.MarkdownFormatter().format(record)
+
+
+def test_queue_handler_drops_instead_of_blocking():
+    q = queue.Queue(1)
+    handler = logger.DroppingQueueHandler(q)
+    before = logger.DroppingQueueHandler.dropped
+    for _ in range(3):
+        handler.handle(logging.makeLogRecord({"msg": "x"}))
+    assert q.qsize() == 1
+    assert logger.DroppingQueueHandler.dropped == before + 2
+
+
+def test_restart_after_shutdown_writes_again(tmp_path, monkeypatch):
+    monkeypatch.setattr(logger, "LOG_DIR", str(tmp_path))
+    logger.shutdown()
+    assert logger._handler not in logger.logger.handlers
+    logger.startup()
+    logger.get_logger().info("after_restart")
+    logger.shutdown()
+    assert "after_restart" in (tmp_path / "app.log.json").read_text()
+    monkeypatch.undo()
+    logger.startup()
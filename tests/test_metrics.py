@@ -0,0 +1,50 @@
+from app.metrics import Counter, Gauge, Histogram, Registry
+
+
+def test_counter_and_histogram_render_prometheus_text():
+    registry = Registry()
+    requests = registry.register(Counter("reqs_total", "Requests.", ("route",)))
+    latency = registry.register(Histogram("lat_seconds", "Latency.", ("route",), buckets=(0.1, 1.0)))
+    requests.inc(route="/feed")
+    requests.inc(2, route="/feed")
+    for value in (0.05, 0.5, 5):
+        latency.observe(value, route="/feed")
+    text = registry.render()
+    assert "# TYPE reqs_total counter" in text and 'reqs_total{route="/feed"} 3' in text
+    assert 'lat_seconds_bucket{route="/feed",le="0.1"} 1' in text
+    assert 'lat_seconds_bucket{route="/feed",le="1.0"} 2' in text
+    assert 'lat_seconds_bucket{route="/feed",le="+Inf"} 3' in text
+    assert 'lat_seconds_count{route="/feed"} 3' in text and 'lat_seconds_sum{route="/feed"} 5.55' in text
+    assert latency.count(route="/feed") == 3 and latency.count(route="/other") == 0
+
+
+def test_gauge_and_label_escaping():
+    registry = Registry()
+    registry.register(Gauge("cache", "Cache stats.", lambda: {"hits": 2, "misses": 1}, ("stat",)))
+    registry.register(Gauge("dropped", "Dropped.", lambda: 0))
+    registry.register(Counter("odd_total", "Odd labels.", ("path",))).inc(path='a"b\\c')
+    text = registry.render()
+    assert 'cache{stat="hits"} 2' in text and "dropped 0" in text
+    assert 'odd_total{path="a\\"b\\\\c"} 1' in text
+
+
+def test_failed_statement_leaves_no_timing_state_behind():
+    import time
+    import pytest
+    from sqlalchemy import create_engine, exc, text
+    from app import metrics
+    engine = create_engine("sqlite://")
+    metrics.instrument_engine(engine)
+    stats = metrics.RequestStats(keep_statements=True)
+    token = metrics._current.set(stats)
+    try:
+        with engine.connect() as conn:
+            with pytest.raises(exc.OperationalError):
+                conn.execute(text("SELECT * FROM missing"))
+            time.sleep(0.05)
+            conn.execute(text("SELECT 1"))
+            # nothing is left behind on the pooled connection
+            assert not conn.connection.info.get("vibe_query_start")
+    finally:
+        metrics._current.reset(token)
+    assert stats.statements == 1 and stats.sql_seconds < 0.05
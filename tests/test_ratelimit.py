@@ -0,0 +1,58 @@
+from app import ratelimit
+from app.ratelimit import MemoryBackend, SQLiteBackend, _slide, _wait
+
+
+def test_slide_weights_previous_window():
+    allowed, entry = True, None
+    for _ in range(4):
+        allowed, entry = _slide(entry, 100.0, 60, 4)
+    assert allowed and entry == (60.0, 4, 0)
+    assert _slide(entry, 110.0, 60, 4)[0] is False
+    # 3/4 into the next window only a quarter of the old count still applies
+    allowed, entry = _slide(entry, 165.0, 60, 4)
+    assert allowed and entry == (120.0, 1, 4)
+    # two windows later everything has expired
+    assert _slide(entry, 300.0, 60, 4)[1] == (300.0, 1, 0)
+
+
+def test_wait_until_the_sliding_estimate_has_room():
+    # full current window: the old count has to slide a quarter out of the next one
+    assert _wait((60.0, 4, 0), 110.0, 60, 4) == 25.0
+    # full previous window: half of it has to slide out
+    assert _wait((120.0, 1, 4), 130.0, 60, 4) == 20.0
+    for entry, now in (((60.0, 4, 0), 110.0), ((120.0, 1, 4), 130.0), ((120.0, 2, 3), 125.0)):
+        wait = _wait(entry, now, 60, 4)
+        assert not _slide(entry, now + wait - 0.5, 60, 4)[0]
+        assert _slide(entry, now + wait, 60, 4)[0]
+    assert _wait((120.0, 1, 0), 130.0, 60, 4) == 0.0
+
+
+def test_memory_backend_limits_and_sweeps():
+    backend = MemoryBackend(sweep_interval=0)
+    assert [backend.hit("k", 2, 60) for _ in range(3)] == [True, True, False]
+    assert backend.hit("other", 2, 60)
+    assert len(backend) == 2
+    import time
+    assert backend.sweep(now=time.time() + 180) == 2
+    assert len(backend) == 0
+
+
+def test_sqlite_backend_is_shared(tmp_path):
+    path = str(tmp_path / "rl.db")
+    # two instances stand in for two worker processes
+    a, b = SQLiteBackend(path), SQLiteBackend(path)
+    assert a.hit("k", 3, 60) and b.hit("k", 3, 60) and a.hit("k", 3, 60)
+    assert not b.hit("k", 3, 60)
+    assert 0 < a.retry_after("k", 3, 60) <= 120
+    a.reset()
+    assert b.hit("k", 3, 60)
+
+
+def test_backend_selected_from_env(tmp_path, monkeypatch):
+    monkeypatch.setenv("VIBE_RL_BACKEND", "sqlite")
+    monkeypatch.setenv("VIBE_RL_SQLITE_PATH", str(tmp_path / "rl.db"))
+    ratelimit.set_backend(None)
+    try:
+        assert isinstance(ratelimit.get_backend(), SQLiteBackend)
+    finally:
+        ratelimit.set_backend(None)
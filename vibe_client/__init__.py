@@ -0,0 +1,11 @@
+"""Python client for the Vibe API: pooled sync and async clients with retries and pagination."""
+from vibe_client.client import (
+    DEFAULT_BASE_URL,
+    MAX_BATCH_ITEMS,
+    AsyncClient,
+    Client,
+    Page,
+    RateLimited,
+    RetryPolicy,
+    VibeError,
+)
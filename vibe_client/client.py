@@ -0,0 +1,452 @@
+"""Sync and async HTTP clients for the Vibe API.
+
+Each client owns one pooled httpx client, so keep-alive connections are reused across calls.
+The clients remember the bearer token from `register`/`login` (and log in again once if it
+expires), retry 429s and transient failures with jittered exponential backoff that respects
+`Retry-After`, and page through listings with iterators that follow `X-Next-Cursor`.
+"""
+import asyncio
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+import httpx
+
+DEFAULT_BASE_URL = "http://127.0.0.1:8000"
+# the server's limit on /posts/batch and /likes/batch (schemas.MAX_BATCH_ITEMS)
+MAX_BATCH_ITEMS = 100
+_IDEMPOTENT = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+# errors raised before the request could reach the server; repeating them is always safe
+_NOT_SENT = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+PostInput = Union[str, Dict[str, Any]]
+
+
+class VibeError(Exception):
+    """The API answered with an error status."""
+
+    def __init__(self, status_code: int, detail: Any, response: Optional[httpx.Response] = None):
+        super().__init__(f"{status_code}: {detail}")
+        self.status_code = status_code
+        self.detail = detail
+        self.response = response
+
+
+class RateLimited(VibeError):
+    """A 429 that was still rejected after all retries; `retry_after` is the server's hint in seconds."""
+
+    def __init__(self, status_code: int, detail: Any, response: Optional[httpx.Response] = None, retry_after: Optional[float] = None):
+        super().__init__(status_code, detail, response)
+        self.retry_after = retry_after
+
+
+class Page(NamedTuple):
+    items: List[Dict[str, Any]]
+    next_cursor: Optional[str]
+
+
+class RetryPolicy:
+    """When to retry a request and how long to wait first.
+
+    429s are always retried: the server rejects them before doing any work. Other retryable
+    statuses and transport errors are only retried for idempotent methods, or when the request
+    never left the client. Waits use full jitter, `uniform(0, min(cap, base * 2**attempt))`, so
+    many clients backing off at once do not retry in lockstep, and never undercut `Retry-After`.
+    """
+
+    def __init__(self, attempts: int = 5, base: float = 0.1, cap: float = 10.0,
+                 statuses: Iterable[int] = (429, 502, 503, 504)):
+        self.attempts = attempts
+        self.base = base
+        self.cap = cap
+        self.statuses = frozenset(statuses)
+
+    def should_retry(self, attempt: int, method: str, response: Optional[httpx.Response] = None,
+                     error: Optional[Exception] = None) -> bool:
+        if attempt + 1 >= self.attempts:
+            return False
+        if error is not None:
+            return isinstance(error, _NOT_SENT) or method in _IDEMPOTENT
+        if response.status_code == 429:
+            return True
+        return response.status_code in self.statuses and method in _IDEMPOTENT
+
+    def delay(self, attempt: int, response: Optional[httpx.Response] = None) -> float:
+        wait = random.uniform(0, min(self.cap, self.base * 2 ** attempt))
+        retry_after = _retry_after(response) if response is not None else None
+        if retry_after is not None:
+            # a little jitter on top so clients released by the same window do not collide again
+            wait = retry_after + random.uniform(0, self.base)
+        return wait
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    value = response.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _error(response: httpx.Response) -> VibeError:
+    try:
+        detail = response.json().get("detail", response.text)
+    except ValueError:
+        detail = response.text
+    if response.status_code == 429:
+        return RateLimited(response.status_code, detail, response, _retry_after(response))
+    return VibeError(response.status_code, detail, response)
+
+
+def _post_item(post: PostInput) -> Dict[str, Any]:
+    return {"content": post} if isinstance(post, str) else dict(post)
+
+
+def _listing_params(cursor: Optional[str], page_size: Optional[int], **extra: Any) -> Dict[str, Any]:
+    params = {name: value for name, value in extra.items() if value is not None}
+    if cursor:
+        params["cursor"] = cursor
+    if page_size is not None:
+        params["page_size"] = page_size
+    return params
+
+
+def _page(response: httpx.Response) -> Page:
+    return Page(response.json(), response.headers.get("x-next-cursor"))
+
+
+def _limits(max_connections: int) -> httpx.Limits:
+    return httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+
+
+class _Base:
+    def __init__(self, token: Optional[str], retry: Optional[RetryPolicy]):
+        self.token = token
+        self.retry = retry or RetryPolicy()
+        self._credentials: Optional[Tuple[str, str]] = None
+
+    def _headers(self, authenticated: bool) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.token}"} if authenticated and self.token else {}
+
+    def _can_relogin(self, response: httpx.Response, authenticated: bool, relogged: bool) -> bool:
+        return response.status_code == 401 and authenticated and not relogged and self._credentials is not None
+
+
+class Client(_Base):
+    """Blocking client. Use as a context manager, or call `close()`, to release pooled connections.
+
+    Pass `http` to supply a preconfigured `httpx.Client` (e.g. a FastAPI `TestClient`); it is then
+    used as-is and `base_url`, `timeout` and `max_connections` are ignored.
+    """
+
+    def __init__(self, base_url: str = DEFAULT_BASE_URL, token: Optional[str] = None, *, timeout: float = 10.0,
+                 max_connections: int = 10, retry: Optional[RetryPolicy] = None, http: Optional[httpx.Client] = None):
+        super().__init__(token, retry)
+        self._http = http or httpx.Client(base_url=base_url, timeout=timeout, limits=_limits(max_connections))
+
+    def __enter__(self) -> "Client":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._http.close()
+
+    def request(self, method: str, path: str, *, authenticated: bool = True, **kwargs: Any) -> httpx.Response:
+        """Send a request with retries; raise `VibeError` for an error status that is not retried."""
+        attempt = 0
+        relogged = False
+        while True:
+            try:
+                response = self._http.request(method, path, headers=self._headers(authenticated), **kwargs)
+            except httpx.TransportError as error:
+                if not self.retry.should_retry(attempt, method, error=error):
+                    raise
+                time.sleep(self.retry.delay(attempt))
+                attempt += 1
+                continue
+            if self._can_relogin(response, authenticated, relogged):
+                relogged = True
+                self.login(*self._credentials)
+                continue
+            if response.status_code < 400:
+                return response
+            if not self.retry.should_retry(attempt, method, response):
+                raise _error(response)
+            time.sleep(self.retry.delay(attempt, response))
+            attempt += 1
+
+    # accounts
+
+    def register(self, username: str, password: str, display_name: Optional[str] = None) -> str:
+        payload = {"username": username, "password": password, "display_name": display_name}
+        self.token = self.request("POST", "/register", json=payload, authenticated=False).json()["access_token"]
+        self._credentials = (username, password)
+        return self.token
+
+    def login(self, username: str, password: str) -> str:
+        form = {"username": username, "password": password}
+        self.token = self.request("POST", "/token", data=form, authenticated=False).json()["access_token"]
+        self._credentials = (username, password)
+        return self.token
+
+    # writes
+
+    def create_post(self, content: str, parent_id: Optional[int] = None) -> Dict[str, Any]:
+        return self.request("POST", "/posts", json={"content": content, "parent_id": parent_id}).json()
+
+    def create_posts(self, posts: Iterable[PostInput]) -> List[Dict[str, Any]]:
+        """One `/posts/batch` request (at most MAX_BATCH_ITEMS posts); one result per post."""
+        return self.request("POST", "/posts/batch", json={"posts": [_post_item(p) for p in posts]}).json()
+
+    def post_many(self, posts: Iterable[PostInput], batch_size: int = MAX_BATCH_ITEMS) -> List[Dict[str, Any]]:
+        """Create any number of posts, `batch_size` per request. Results are in input order and
+        their `index` is the position in `posts`."""
+        items = [_post_item(p) for p in posts]
+        results: List[Dict[str, Any]] = []
+        for offset in range(0, len(items), batch_size):
+            for result in self.create_posts(items[offset:offset + batch_size]):
+                result["index"] += offset
+                results.append(result)
+        return results
+
+    def like(self, post_id: int) -> None:
+        self.request("POST", f"/posts/{post_id}/like")
+
+    def unlike(self, post_id: int) -> None:
+        self.request("DELETE", f"/posts/{post_id}/like")
+
+    def like_many(self, post_ids: Iterable[int]) -> List[Dict[str, Any]]:
+        return self.request("POST", "/likes/batch", json={"post_ids": list(post_ids)}).json()
+
+    def follow(self, username: str) -> None:
+        self.request("POST", f"/users/{username}/follow")
+
+    def unfollow(self, username: str) -> None:
+        self.request("DELETE", f"/users/{username}/follow")
+
+    # reads
+
+    def get_post(self, post_id: int, include_replies: Optional[str] = None) -> Dict[str, Any]:
+        return self.request("GET", f"/posts/{post_id}", params=_listing_params(None, None, include_replies=include_replies)).json()
+
+    def profile(self, username: str, cursor: Optional[str] = None, page_size: Optional[int] = None,
+                include_replies: Optional[str] = None) -> Dict[str, Any]:
+        params = _listing_params(cursor, page_size, include_replies=include_replies)
+        return self.request("GET", f"/users/{username}", params=params).json()
+
+    def feed(self, cursor: Optional[str] = None, page_size: Optional[int] = None, include_replies: Optional[str] = None) -> Page:
+        return _page(self.request("GET", "/feed", params=_listing_params(cursor, page_size, include_replies=include_replies)))
+
+    def user_posts(self, username: str, cursor: Optional[str] = None, page_size: Optional[int] = None) -> Page:
+        return _page(self.request("GET", f"/users/{username}/posts", params=_listing_params(cursor, page_size)))
+
+    def replies(self, post_id: int, cursor: Optional[str] = None, page_size: Optional[int] = None) -> Page:
+        return _page(self.request("GET", f"/posts/{post_id}/replies", params=_listing_params(cursor, page_size)))
+
+    def timeline(self, cursor: Optional[str] = None, page_size: Optional[int] = None) -> Page:
+        return _page(self.request("GET", "/timeline", params=_listing_params(cursor, page_size)))
+
+    def search(self, q: str, cursor: Optional[str] = None, page_size: Optional[int] = None) -> Page:
+        return _page(self.request("GET", "/search", params=_listing_params(cursor, page_size, q=q)))
+
+    # iterators: every item of a listing, fetching pages as they are consumed
+
+    def iter_feed(self, page_size: int = 100, include_replies: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        return self._iterate("/feed", _listing_params(None, page_size, include_replies=include_replies))
+
+    def iter_user_posts(self, username: str, page_size: int = 100) -> Iterator[Dict[str, Any]]:
+        return self._iterate(f"/users/{username}/posts", {"page_size": page_size})
+
+    def iter_replies(self, post_id: int, page_size: int = 100) -> Iterator[Dict[str, Any]]:
+        return self._iterate(f"/posts/{post_id}/replies", {"page_size": page_size})
+
+    def iter_timeline(self, page_size: int = 100) -> Iterator[Dict[str, Any]]:
+        return self._iterate("/timeline", {"page_size": page_size})
+
+    def iter_search(self, q: str, page_size: int = 100) -> Iterator[Dict[str, Any]]:
+        return self._iterate("/search", {"q": q, "page_size": page_size})
+
+    def _iterate(self, path: str, params: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        cursor = None
+        while True:
+            page = _page(self.request("GET", path, params={**params, **({"cursor": cursor} if cursor else {})}))
+            yield from page.items
+            cursor = page.next_cursor
+            if not cursor:
+                return
+
+
+class AsyncClient(_Base):
+    """asyncio client; safe to share between tasks. Use `async with`, or await `aclose()`.
+
+    Iterators fetch the next page while the caller consumes the current one, and `post_many`
+    keeps up to `concurrency` batch requests in flight. An iterator left early with `break`
+    keeps its prefetch running until it is garbage collected; wrap it in
+    `contextlib.aclosing()` to cancel the prefetch right away.
+    """
+
+    def __init__(self, base_url: str = DEFAULT_BASE_URL, token: Optional[str] = None, *, timeout: float = 10.0,
+                 max_connections: int = 10, retry: Optional[RetryPolicy] = None, http: Optional[httpx.AsyncClient] = None):
+        super().__init__(token, retry)
+        self._http = http or httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=_limits(max_connections))
+        self._login_lock = asyncio.Lock()
+
+    async def __aenter__(self) -> "AsyncClient":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        await self._http.aclose()
+
+    async def request(self, method: str, path: str, *, authenticated: bool = True, **kwargs: Any) -> httpx.Response:
+        """Send a request with retries; raise `VibeError` for an error status that is not retried."""
+        attempt = 0
+        relogged = False
+        while True:
+            token = self.token
+            try:
+                response = await self._http.request(method, path, headers=self._headers(authenticated), **kwargs)
+            except httpx.TransportError as error:
+                if not self.retry.should_retry(attempt, method, error=error):
+                    raise
+                await asyncio.sleep(self.retry.delay(attempt))
+                attempt += 1
+                continue
+            if self._can_relogin(response, authenticated, relogged):
+                relogged = True
+                async with self._login_lock:
+                    # many tasks can hit the expiry together; only the first logs in again
+                    if self.token == token:
+                        await self.login(*self._credentials)
+                continue
+            if response.status_code < 400:
+                return response
+            if not self.retry.should_retry(attempt, method, response):
+                raise _error(response)
+            await asyncio.sleep(self.retry.delay(attempt, response))
+            attempt += 1
+
+    # accounts
+
+    async def register(self, username: str, password: str, display_name: Optional[str] = None) -> str:
+        payload = {"username": username, "password": password, "display_name": display_name}
+        self.token = (await self.request("POST", "/register", json=payload, authenticated=False)).json()["access_token"]
+        self._credentials = (username, password)
+        return self.token
+
+    async def login(self, username: str, password: str) -> str:
+        form = {"username": username, "password": password}
+        self.token = (await self.request("POST", "/token", data=form, authenticated=False)).json()["access_token"]
+        self._credentials = (username, password)
+        return self.token
+
+    # writes
+
+    async def create_post(self, content: str, parent_id: Optional[int] = None) -> Dict[str, Any]:
+        return (await self.request("POST", "/posts", json={"content": content, "parent_id": parent_id})).json()
+
+    async def create_posts(self, posts: Iterable[PostInput]) -> List[Dict[str, Any]]:
+        """One `/posts/batch` request (at most MAX_BATCH_ITEMS posts); one result per post."""
+        return (await self.request("POST", "/posts/batch", json={"posts": [_post_item(p) for p in posts]})).json()
+
+    async def post_many(self, posts: Iterable[PostInput], concurrency: int = 4,
+                        batch_size: int = MAX_BATCH_ITEMS) -> List[Dict[str, Any]]:
+        """Create any number of posts, `batch_size` per request with at most `concurrency` requests
+        in flight. Results are in input order and their `index` is the position in `posts`."""
+        items = [_post_item(p) for p in posts]
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def send(offset: int) -> List[Dict[str, Any]]:
+            async with semaphore:
+                results = await self.create_posts(items[offset:offset + batch_size])
+            for result in results:
+                result["index"] += offset
+            return results
+
+        batches = await asyncio.gather(*(send(offset) for offset in range(0, len(items), batch_size)))
+        return [result for results in batches for result in results]
+
+    async def like(self, post_id: int) -> None:
+        await self.request("POST", f"/posts/{post_id}/like")
+
+    async def unlike(self, post_id: int) -> None:
+        await self.request("DELETE", f"/posts/{post_id}/like")
+
+    async def like_many(self, post_ids: Iterable[int]) -> List[Dict[str, Any]]:
+        return (await self.request("POST", "/likes/batch", json={"post_ids": list(post_ids)})).json()
+
+    async def follow(self, username: str) -> None:
+        await self.request("POST", f"/users/{username}/follow")
+
+    async def unfollow(self, username: str) -> None:
+        await self.request("DELETE", f"/users/{username}/follow")
+
+    # reads
+
+    async def get_post(self, post_id: int, include_replies: Optional[str] = None) -> Dict[str, Any]:
+        params = _listing_params(None, None, include_replies=include_replies)
+        return (await self.request("GET", f"/posts/{post_id}", params=params)).json()
+
+    async def profile(self, username: str, cursor: Optional[str] = None, page_size: Optional[int] = None,
+                      include_replies: Optional[str] = None) -> Dict[str, Any]:
+        params = _listing_params(cursor, page_size, include_replies=include_replies)
+        return (await self.request("GET", f"/users/{username}", params=params)).json()
+
+    async def feed(self, cursor: Optional[str] = None, page_size: Optional[int] = None, include_replies: Optional[str] = None) -> Page:
+        return _page(await self.request("GET", "/feed", params=_listing_params(cursor, page_size, include_replies=include_replies)))
+
+    async def user_posts(self, username: str, cursor: Optional[str] = None, page_size: Optional[int] = None) -> Page:
+        return _page(await self.request("GET", f"/users/{username}/posts", params=_listing_params(cursor, page_size)))
+
+    async def replies(self, post_id: int, cursor: Optional[str] = None, page_size: Optional[int] = None) -> Page:
+        return _page(await self.request("GET", f"/posts/{post_id}/replies", params=_listing_params(cursor, page_size)))
+
+    async def timeline(self, cursor: Optional[str] = None, page_size: Optional[int] = None) -> Page:
+        return _page(await self.request("GET", "/timeline", params=_listing_params(cursor, page_size)))
+
+    async def search(self, q: str, cursor: Optional[str] = None, page_size: Optional[int] = None) -> Page:
+        return _page(await self.request("GET", "/search", params=_listing_params(cursor, page_size, q=q)))
+
+    # iterators: `async for post in client.iter_feed(): ...`
+
+    def iter_feed(self, page_size: int = 100, include_replies: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        return self._iterate("/feed", _listing_params(None, page_size, include_replies=include_replies))
+
+    def iter_user_posts(self, username: str, page_size: int = 100) -> AsyncIterator[Dict[str, Any]]:
+        return self._iterate(f"/users/{username}/posts", {"page_size": page_size})
+
+    def iter_replies(self, post_id: int, page_size: int = 100) -> AsyncIterator[Dict[str, Any]]:
+        return self._iterate(f"/posts/{post_id}/replies", {"page_size": page_size})
+
+    def iter_timeline(self, page_size: int = 100) -> AsyncIterator[Dict[str, Any]]:
+        return self._iterate("/timeline", {"page_size": page_size})
+
+    def iter_search(self, q: str, page_size: int = 100) -> AsyncIterator[Dict[str, Any]]:
+        return self._iterate("/search", {"q": q, "page_size": page_size})
+
+    async def _iterate(self, path: str, params: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        async def fetch(cursor: Optional[str]) -> Page:
+            return _page(await self.request("GET", path, params={**params, **({"cursor": cursor} if cursor else {})}))
+
+        pending = asyncio.ensure_future(fetch(None))
+        try:
+            while pending is not None:
+                page = await pending
+                # prefetch the next page while the caller works through this one
+                pending = asyncio.ensure_future(fetch(page.next_cursor)) if page.next_cursor else None
+                for item in page.items:
+                    yield item
+        finally:
+            if pending is not None:
+                pending.cancel()